@@ -9,9 +9,54 @@ TAG_COLOR_DEFAULT = '#49B64E'
 # Recipe constants
 RECIPE_MAX_LENGTH = 200
 
+# Recipe search
+RECIPE_SEARCH_CONFIG = 'russian'
+# Веса A, B и C ts_rank по умолчанию для индекса в памяти
+RECIPE_SEARCH_WEIGHTS = {'name': 1.0, 'ingredients': 0.4, 'text': 0.2}
+
+# Anonymous response cache
+RECIPES_VERSION_KEY = 'recipes:version'
+ANONYMOUS_CACHE_KEY = 'recipes:anonymous:{version}:{action}:{digest}'
+
+# Token authentication cache
+AUTH_TOKEN_CACHE_KEY = 'auth:token:{digest}'
+
+# Shopping cart batch operations
+CART_BATCH_LIMIT = 500
+
+# Subscriptions feed
+FEED_CACHE_KEY = 'feed:{user_id}:{version}:{limit}'
+FEED_VERSION_KEY = 'feed:version:{user_id}'
+FEED_CACHE_TIMEOUT = 60
+
+# Recipe matching by ingredients on hand
+MATCH_VERSION_KEY = 'matcher:version'
+MATCH_CHANGE_KEY = 'matcher:change:{version}'
+MATCH_INDEX_TIMEOUT = 30 * 60
+MATCH_SYNC_MAX_CHANGES = 1000
+MATCH_RESULTS_LIMIT = 50
+MATCH_MAX_MISSING = 5
+
+# Recipe images
+IMAGE_FORMAT = 'WEBP'
+IMAGE_QUALITY = 80
+IMAGE_MAX_SIZE = (1280, 1280)
+IMAGE_VARIANTS = {
+    'image_card': (480, 480),
+    'image_detail': (960, 960),
+}
+IMAGE_WORKERS = 2
+
 # Ingredient constants
 INGREDIENTS_NAME_MAX_LENGTH = 200
 INGREDIENTS_MEASUREMENT_MAX_LENGTH = 20
+INGREDIENTS_IMPORT_BATCH_SIZE = 500
+INGREDIENTS_IMPORT_READ_SIZE = 64 * 1024
+INGREDIENTS_SEARCH_LIMIT = 20
+
+# Tag and ingredient catalogs
+CATALOG_CACHE_TIMEOUT = 5 * 60
+CATALOG_VERSION_KEY = 'catalog:version:{name}'
 
 # SERIALIZERS
 MINIMUM_AMOUNT = 0
@@ -26,6 +71,7 @@ FONTS_ROOT = os.path.abspath(
                  'services',
                  'fonts')
 )
+FONT_NAME = 'arial'
 HEADER_FONT_SIZE = 28
 HEADER_TOP_MARGIN = 20
 HEADER_BOTTOM_MARGIN = 35
@@ -36,7 +82,13 @@ TEXT_BOTTOM_MARGIN = 12
 TEXT_RIGHT_MARGIN = 12
 TEXT_LEFT_MARGIN = 50
 SPACER = 1
-STREAM_POSITION = 0
+SHOPPING_LIST_CACHE_KEY = 'shoplist:pdf:{user_id}'
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60 * 24
+SHOPPING_LIST_TITLE = 'Список покупок'
+SHOPPING_LIST_CSV_HEADER = ('Ингредиент', 'Количество', 'Единицы измерения')
+SHOPPING_LIST_FORMATS = ('pdf', 'txt', 'csv')
+SHOPPING_LIST_DEFAULT_FORMAT = 'pdf'
+EXPORT_WORKERS_POLL_INTERVAL = 1
 
 # Verbose names
 EMAIL_VERBOSE_NAME = 'адрес электронной почты'
@@ -45,6 +97,8 @@ FOLLOWER_VERBOSE_NAME = 'Подписчик'
 AUTHOR_VERBOSE_NAME = 'Автор'
 USER_VERBOSE_NAME = 'Пользователь'
 SUBSCRIBE_VERBOSE_NAME = 'Подписка'
+RECIPES_COUNT_VERBOSE_NAME = 'Кол-во рецептов'
+FOLLOWERS_COUNT_VERBOSE_NAME = 'Кол-во подписчиков'
 
 # Error messages
 EMAIL_ALREADY_REGISTERED = 'Такой адрес электронной почты уже зарегистрирован.'
@@ -0,0 +1,179 @@
+import random
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import serializers
+
+from backend.services.metrics import endpoint_stats
+
+serializer_timer = ContextVar('serializer_timer', default=None)
+
+
+class QueryTimer:
+    """execute_wrapper, считающий запросы к БД и время их выполнения."""
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.queries += 1
+
+
+class SerializerTimer:
+    """
+    Время внутри serializer.data и is_valid() без запросов к БД, которые
+    выполнялись за это время. Вложенные вызовы не считаются повторно.
+    """
+
+    def __init__(self, query_timer):
+        self.query_timer = query_timer
+        self.duration = 0.0
+        self.depth = 0
+
+    def measure(self, call):
+        if self.depth:
+            return call()
+        self.depth += 1
+        started = time.perf_counter()
+        db_started = self.query_timer.duration
+        try:
+            return call()
+        finally:
+            self.depth -= 1
+            self.duration += (
+                time.perf_counter() - started
+                - (self.query_timer.duration - db_started)
+            )
+
+
+def timed(method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        timer = serializer_timer.get()
+        if timer is None:
+            return method(self, *args, **kwargs)
+        return timer.measure(lambda: method(self, *args, **kwargs))
+    wrapper.perf_timed = True
+    return wrapper
+
+
+def instrument_serializers():
+    """
+    Оборачивает data и is_valid() сериализаторов DRF. Вне замеряемого
+    запроса обёртка сразу вызывает исходный метод.
+    """
+    for serializer_class in (serializers.BaseSerializer,
+                             serializers.Serializer,
+                             serializers.ListSerializer):
+        attributes = vars(serializer_class)
+        data = attributes['data']
+        if not getattr(data.fget, 'perf_timed', False):
+            serializer_class.data = property(timed(data.fget))
+        is_valid = attributes.get('is_valid')
+        if is_valid and not getattr(is_valid, 'perf_timed', False):
+            serializer_class.is_valid = timed(is_valid)
+
+
+def endpoint_name(request):
+    """ViewSet.action для DRF, иначе класс или функция view и метод."""
+    view = getattr(request, 'perf_view', None)
+    if view is None:
+        return None
+    view_class = getattr(view, 'cls', None)
+    if view_class is None:
+        return f'{view.__module__}.{view.__name__}'
+    actions = getattr(view, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+def show_timing(request):
+    """Замеры раскрывают устройство API, поэтому отдаются не всем."""
+    if settings.DEBUG:
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_staff)
+
+
+def server_timing(sample):
+    return (
+        f'db;dur={sample["db"]:.1f};desc="{sample["queries"]} queries", '
+        f'serializer;dur={sample["serializer"]:.1f}, '
+        f'app;dur={sample["app"]:.1f}, '
+        f'render;dur={sample["render"]:.1f}, '
+        f'total;dur={sample["total"]:.1f}'
+    )
+
+
+class PerformanceMiddleware:
+    """
+    Замеряет время запроса, число и время запросов к БД, время работы
+    сериализаторов и отрисовки ответа для доли запросов PERF_SAMPLE_RATE.
+    Копит замеры по view/action для manage.py perf_report; заголовок
+    Server-Timing получают только staff-пользователи и режим DEBUG.
+    При PERF_SAMPLE_RATE = 0 middleware отключается и сериализаторы
+    не оборачиваются.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PERF_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        instrument_serializers()
+
+    def __call__(self, request):
+        if random.random() >= settings.PERF_SAMPLE_RATE:
+            return self.get_response(request)
+        timer = QueryTimer()
+        serializing = SerializerTimer(timer)
+        token = serializer_timer.set(serializing)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                response = self.get_response(request)
+        finally:
+            serializer_timer.reset(token)
+        total = time.perf_counter() - started
+        render = getattr(request, 'perf_render', 0.0)
+        serializer = serializing.duration
+        sample = {
+            'total': total * 1000,
+            'db': timer.duration * 1000,
+            'serializer': serializer * 1000,
+            'render': render * 1000,
+            'app': max(
+                total - timer.duration - serializer - render, 0
+            ) * 1000,
+            'queries': timer.queries,
+        }
+        if show_timing(request):
+            response['Server-Timing'] = server_timing(sample)
+        endpoint = endpoint_name(request)
+        if endpoint is not None:
+            endpoint_stats.record(endpoint, sample)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.perf_view = view_func
+
+    def process_template_response(self, request, response):
+        started = time.perf_counter()
+
+        def rendered(response):
+            request.perf_render = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
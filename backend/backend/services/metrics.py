@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import defaultdict, deque
+from threading import Lock
+
+from django.conf import settings
+
+METRICS = ('total', 'db', 'serializer', 'app', 'render', 'queries')
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class EndpointStats:
+    """
+    Последние замеры по каждому view/action в памяти процесса.
+    Периодически сбрасываются в файл процесса в PERF_REPORT_DIR, откуда
+    их собирает manage.py perf_report. Файлы, не обновлявшиеся дольше
+    PERF_REPORT_MAX_AGE, не учитываются и удаляются.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._samples = defaultdict(self._new_samples)
+        self._counters = {}
+        self._flushed = time.monotonic()
+
+    def register_counters(self, name, collect):
+        """
+        Добавляет в отчёт счётчики другого компонента: collect возвращает
+        словарь чисел, которые суммируются по всем процессам.
+        """
+        self._counters[name] = collect
+
+    @staticmethod
+    def _new_samples():
+        return {
+            'count': 0,
+            'samples': deque(maxlen=settings.PERF_MAX_SAMPLES),
+        }
+
+    def record(self, endpoint, sample):
+        with self._lock:
+            stats = self._samples[endpoint]
+            stats['count'] += 1
+            stats['samples'].append(tuple(sample[name] for name in METRICS))
+        if (time.monotonic() - self._flushed
+                > settings.PERF_FLUSH_INTERVAL):
+            try:
+                self.flush()
+            except OSError:
+                logging.exception('Could not write performance samples')
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                endpoint: {
+                    'count': stats['count'],
+                    'samples': list(stats['samples']),
+                }
+                for endpoint, stats in self._samples.items()
+            }
+
+    def flush(self):
+        self._flushed = time.monotonic()
+        directory = settings.PERF_REPORT_DIR
+        os.makedirs(directory, exist_ok=True)
+        descriptor, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        report = {
+            'metrics': METRICS,
+            'endpoints': self.snapshot(),
+            'counters': {
+                name: collect() for name, collect in self._counters.items()
+            },
+        }
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(report, file)
+        os.replace(path, os.path.join(directory, f'{os.getpid()}.json'))
+        remove_stale_reports(directory)
+
+
+endpoint_stats = EndpointStats()
+
+
+def is_stale(path):
+    return (time.time() - os.path.getmtime(path)
+            > settings.PERF_REPORT_MAX_AGE)
+
+
+def remove_stale_reports(directory):
+    """
+    Удаляет файлы завершившихся процессов: живой процесс перезаписывает
+    свой файл целиком при следующем сбросе, так что теряются только
+    замеры старше PERF_REPORT_MAX_AGE.
+    """
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if is_stale(path):
+                os.remove(path)
+        except FileNotFoundError:
+            # Файл уже удалил другой процесс.
+            continue
+
+
+def load_reports(directory):
+    """
+    Объединяет файлы всех процессов: {endpoint: {count, samples}} и
+    суммы зарегистрированных счётчиков {name: {counter: value}}.
+    """
+    merged = defaultdict(lambda: {'count': 0, 'samples': []})
+    counters = defaultdict(lambda: defaultdict(int))
+    if not os.path.isdir(directory):
+        return merged, counters
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not name.endswith('.json'):
+            continue
+        try:
+            if is_stale(path):
+                continue
+            with open(path) as file:
+                report = json.load(file)
+        except FileNotFoundError:
+            continue
+        if report.get('metrics') != list(METRICS):
+            # Файл процесса с прежним набором метрик.
+            continue
+        for endpoint, stats in report['endpoints'].items():
+            merged[endpoint]['count'] += stats['count']
+            merged[endpoint]['samples'].extend(stats['samples'])
+        for group, values in report['counters'].items():
+            for counter, value in values.items():
+                counters[group][counter] += value
+    return merged, counters
+
+
+def summarize(stats):
+    """p50/p95/p99 по каждой метрике из списка замеров."""
+    columns = {name: () for name in METRICS}
+    columns.update(zip(METRICS, zip(*stats['samples'])))
+    return {
+        'count': stats['count'],
+        'sampled': len(stats['samples']),
+        **{
+            name: {
+                'p50': percentile(values, 0.5),
+                'p95': percentile(values, 0.95),
+                'p99': percentile(values, 0.99),
+            }
+            for name, values in columns.items()
+        },
+    }
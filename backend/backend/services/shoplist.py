@@ -1,5 +1,6 @@
 from backend.constants import (
     FONTS_ROOT,
+    FONT_NAME,
     HEADER_FONT_SIZE,
     HEADER_TOP_MARGIN,
     HEADER_BOTTOM_MARGIN,
@@ -10,12 +11,18 @@ from backend.constants import (
     TEXT_RIGHT_MARGIN,
     TEXT_LEFT_MARGIN,
     SPACER,
-    STREAM_POSITION,
+    SHOPPING_LIST_CACHE_KEY,
+    SHOPPING_LIST_CACHE_TIMEOUT,
+    SHOPPING_LIST_CSV_HEADER,
+    SHOPPING_LIST_TITLE,
 )
+import csv
+import hashlib
 import io
 import os
 import logging
-from django.http import FileResponse
+from django.core.cache import cache
+from django.http import FileResponse, StreamingHttpResponse
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import ParagraphStyle
@@ -26,35 +33,43 @@ from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
 
 logging.basicConfig(level=logging.DEBUG)
 
+HEADER_STYLE = ParagraphStyle(
+    name='Header', fontName=FONT_NAME,
+    fontSize=HEADER_FONT_SIZE, alignment=TA_CENTER
+)
+BODY_STYLE = ParagraphStyle(
+    name='Body', fontName=FONT_NAME,
+    fontSize=BODY_FONT_SIZE, alignment=TA_LEFT
+)
+
+
+def register_fonts():
+    """Регистрирует шрифт списка покупок. Вызывается один раз при старте."""
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(FONT_NAME, os.path.join(FONTS_ROOT, 'arial.ttf'))
+        )
+
 
-def header(doc, title, size, space, ta):
+def header(doc, title, space):
     doc.append(Spacer(SPACER, HEADER_TOP_MARGIN))
-    doc.append(Paragraph(title, ParagraphStyle(
-        name='Header', fontName='arial', fontSize=size, alignment=ta
-    )))
+    doc.append(Paragraph(title, HEADER_STYLE))
     doc.append(Spacer(SPACER, space))
     return doc
 
 
-def body(doc, text, size):
+def body(doc, text):
     for line in text:
-        doc.append(Paragraph(line, ParagraphStyle(
-            name='Body', fontName='arial', fontSize=size, alignment=TA_LEFT
-        )))
+        doc.append(Paragraph(line, BODY_STYLE))
         doc.append(Spacer(SPACER, BODY_LINE_SPACING))
     return doc
 
 
-def download_pdf(data):
+def render_pdf(data):
     try:
+        register_fonts()
         buffer = io.BytesIO()
-        font_path = os.path.join(FONTS_ROOT, 'arial.ttf')
-        pdfmetrics.registerFont(TTFont('arial', font_path))
-        doc = header(
-            [], 'Список покупок',
-            HEADER_FONT_SIZE,
-            HEADER_BOTTOM_MARGIN, TA_CENTER
-        )
+        doc = header([], SHOPPING_LIST_TITLE, HEADER_BOTTOM_MARGIN)
         pdf = SimpleDocTemplate(
             buffer,
             pagesize=A4,
@@ -63,13 +78,97 @@ def download_pdf(data):
             rightMargin=TEXT_RIGHT_MARGIN,
             leftMargin=TEXT_LEFT_MARGIN,
         )
-        pdf.build(body(doc, data, BODY_FONT_SIZE))
-        buffer.seek(STREAM_POSITION)
-        return FileResponse(
-            buffer,
-            as_attachment=True,
-            filename='shopping_list.pdf'
-        )
+        pdf.build(body(doc, data))
+        return buffer.getvalue()
     except Exception as e:
         logging.exception("An error occurred while generating PDF")
         raise e
+
+
+def get_pdf(data, user_id):
+    """
+    Возвращает PDF списка покупок, не вызывая ReportLab для неизменной
+    корзины. Запись в кэше сверяется с хэшем содержимого, поэтому
+    изменения, прошедшие мимо сигналов (bulk_create, переименование
+    ингредиента), тоже приводят к перерисовке.
+    """
+    digest = hashlib.sha256('\n'.join(data).encode()).hexdigest()
+    key = SHOPPING_LIST_CACHE_KEY.format(user_id=user_id)
+    cached = cache.get(key)
+    if cached is not None and cached[0] == digest:
+        return cached[1]
+    content = render_pdf(data)
+    cache.set(key, (digest, content), SHOPPING_LIST_CACHE_TIMEOUT)
+    return content
+
+
+def invalidate_shopping_list(*user_ids):
+    cache.delete_many([
+        SHOPPING_LIST_CACHE_KEY.format(user_id=user_id)
+        for user_id in user_ids
+    ])
+
+
+def download_pdf(data, user_id):
+    return FileResponse(
+        io.BytesIO(get_pdf(data, user_id)),
+        as_attachment=True,
+        filename='shopping_list.pdf'
+    )
+
+
+def shopping_list_lines(ingredients):
+    for index, item in enumerate(ingredients, 1):
+        yield (
+            f'{index:02}. {item["ingredient__name"].capitalize()} - '
+            f'{item["sum_amount"]} {item["ingredient__measurement_unit"]}'
+        )
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def stream_txt(ingredients):
+    yield f'{SHOPPING_LIST_TITLE}\n\n'
+    for line in shopping_list_lines(ingredients):
+        yield f'{line}\n'
+
+
+def stream_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(SHOPPING_LIST_CSV_HEADER)
+    for item in ingredients:
+        yield writer.writerow((
+            item['ingredient__name'].capitalize(),
+            item['sum_amount'],
+            item['ingredient__measurement_unit'],
+        ))
+
+
+STREAMS = {
+    'txt': (stream_txt, 'text/plain; charset=utf-8'),
+    'csv': (stream_csv, 'text/csv; charset=utf-8'),
+}
+
+
+def download_stream(ingredients, file_format):
+    stream, content_type = STREAMS[file_format]
+    response = StreamingHttpResponse(
+        stream(ingredients), content_type=content_type
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="shopping_list.{file_format}"'
+    )
+    return response
+
+
+def render_shopping_list(ingredients, file_format, user_id):
+    """Возвращает файл списка покупок целиком, для фоновой выгрузки."""
+    if file_format in STREAMS:
+        stream, _ = STREAMS[file_format]
+        return ''.join(stream(ingredients)).encode()
+    return get_pdf(list(shopping_list_lines(ingredients)), user_id)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -30,6 +31,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,6 +73,30 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        # locmem по умолчанию — только для разработки и тестов: у каждого
+        # процесса gunicorn свой кэш, и сброс версий из другого процесса
+        # или команды manage.py до него не доходит. В infra/docker-compose
+        # CACHE_BACKEND и CACHE_LOCATION указывают на общий memcached.
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+        'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', '300')),
+    }
+}
+
+ANONYMOUS_CACHE_TIMEOUT = int(os.getenv('ANONYMOUS_CACHE_TIMEOUT', '300'))
+
+# Кэш токен -> пользователь: локальный LRU процесса и, по желанию, общий
+# кэш. Сброс в других процессах виден не позже AUTH_TOKEN_CACHE_TIMEOUT.
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '10000'))
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', '60'))
+AUTH_TOKEN_CACHE_SHARED = (
+    os.getenv('AUTH_TOKEN_CACHE_SHARED', 'False').lower() == 'true'
+)
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -106,6 +132,16 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Замеры PerformanceMiddleware: в продакшене выключены, пока не задан
+# PERF_SAMPLE_RATE; файлы замеров пишутся вне каталога с кодом.
+PERF_SAMPLE_RATE = float(os.getenv('PERF_SAMPLE_RATE', '0.1' if DEBUG else '0'))
+PERF_MAX_SAMPLES = int(os.getenv('PERF_MAX_SAMPLES', '1000'))
+PERF_FLUSH_INTERVAL = int(os.getenv('PERF_FLUSH_INTERVAL', '30'))
+PERF_REPORT_DIR = os.getenv(
+    'PERF_REPORT_DIR', os.path.join(tempfile.gettempdir(), 'foodgram-perf')
+)
+PERF_REPORT_MAX_AGE = int(os.getenv('PERF_REPORT_MAX_AGE', '86400'))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
@@ -115,7 +151,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachingTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS':
         'recipes.paginations.CustomPageNumberPagination',
@@ -3,7 +3,8 @@ from django.core.exceptions import ValidationError
 from django.forms.models import BaseInlineFormSet
 
 from recipes.models import (
-    Ingredient, Recipe, Tag, IngredientRecipe, ShoppingCart, Favorite
+    Ingredient, Recipe, Tag, IngredientRecipe, ShoppingCart, Favorite,
+    ShoppingListExport
 )
 
 
@@ -50,13 +51,13 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ('name', 'author', 'tags')
     ordering = ('-pub_date',)
     inlines = (IngredientRecipeInline,)
-    readonly_fields = ('favorite_count', 'pub_date')
+    readonly_fields = ('favorite_count', 'carts_count', 'pub_date')
     list_display_links = ('name',)
     search_fields = ('name',)
 
     @admin.display(description='Кол-во добавлений в избранное')
     def favorite_count(self, recipe):
-        return recipe.favorites_recipe.count()
+        return recipe.favorites_count
 
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
@@ -84,3 +85,12 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe')
     list_display_links = ('user',)
     search_fields = ('user',)
+
+
+@admin.register(ShoppingListExport)
+class ShoppingListExportAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'file_format', 'status',
+                    'created', 'finished')
+    list_filter = ('status', 'file_format')
+    list_display_links = ('user',)
+    readonly_fields = ('created', 'finished')
@@ -5,3 +5,10 @@ class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
     verbose_name = 'Рецепты'
+
+    def ready(self):
+        from backend.services.shoplist import register_fonts
+
+        from . import signals  # noqa: F401
+
+        register_fonts()
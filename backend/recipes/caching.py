@@ -0,0 +1,178 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import HttpResponseNotModified
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework.response import Response
+
+from backend.constants import ANONYMOUS_CACHE_KEY, RECIPES_VERSION_KEY
+from .feed import user_version
+from .models import Recipe
+
+
+def recipes_version():
+    """
+    Версия — время её смены в наносекундах, а не счётчик, чтобы версии
+    разных процессов с локальным кэшем не совпадали. Версия живёт не
+    дольше закэшированных ответов: смена из другого процесса, которую
+    локальный кэш не видит, ждёт не больше ANONYMOUS_CACHE_TIMEOUT.
+    """
+    return cache.get_or_set(
+        RECIPES_VERSION_KEY, time.time_ns, settings.ANONYMOUS_CACHE_TIMEOUT
+    )
+
+
+def bump_recipes_version():
+    """
+    Делает недействительными все закэшированные ответы о рецептах.
+    Версия меняется после фиксации транзакции, чтобы параллельный запрос
+    не успел сохранить под новой версией ещё старые данные.
+    """
+    def bump():
+        cache.set(
+            RECIPES_VERSION_KEY, time.time_ns(),
+            settings.ANONYMOUS_CACHE_TIMEOUT
+        )
+
+    transaction.on_commit(bump)
+
+
+def normalized_params(request):
+    return sorted(
+        (name, value)
+        for name in request.query_params
+        for value in request.query_params.getlist(name)
+    )
+
+
+def anonymous_cache_key(request, action, pk=None, etag=None):
+    """
+    Ключ ответа: порядок параметров запроса на ключ не влияет. ETag из
+    updated_at рецептов делает ключ новым после любой записи, в том числе
+    из другого процесса.
+    """
+    digest = hashlib.sha1(
+        repr((pk, normalized_params(request), etag)).encode()
+    ).hexdigest()
+    return ANONYMOUS_CACHE_KEY.format(
+        version=recipes_version(), action=action, digest=digest
+    )
+
+
+class AnonymousCacheMixin:
+    """
+    Кэширует ответы list и retrieve для неавторизованных пользователей:
+    у них нет персональных полей, поэтому ответ одинаков для всех. Ключ
+    включает ETag, посчитанный ConditionalGetMixin; курсорные страницы
+    без ETag полагаются только на версию и могут отставать от записей
+    других процессов на ANONYMOUS_CACHE_TIMEOUT, если кэш не общий.
+    """
+    etag = None
+
+    def cached_response(self, request, method, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return method(request, *args, **kwargs)
+        key = anonymous_cache_key(
+            request, self.action, kwargs.get('pk'), self.etag
+        )
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = method(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.ANONYMOUS_CACHE_TIMEOUT)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().list, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().retrieve, *args, **kwargs
+        )
+
+
+class ConditionalGetMixin:
+    """
+    ETag и Last-Modified для list и retrieve по updated_at рецептов: для
+    списка — Max(updated_at) и число рецептов под фильтром, для страницы
+    рецепта — значение строки. Запись из другого процесса или команды
+    сразу меняет валидаторы. Курсорные страницы валидаторов не получают:
+    агрегат по всей выборке стоил бы дороже самой страницы. При совпадении
+    ответ 304 отдаётся без сериализации.
+    """
+
+    def get_validators(self, request, pk=None):
+        if pk is not None:
+            try:
+                queryset = Recipe.objects.filter(pk=int(pk))
+            except ValueError:
+                return None, None
+        elif self.paginator.cursor_pagination_class.cursor_query_param in (
+                request.query_params):
+            return None, None
+        else:
+            queryset = self.filter_queryset(Recipe.objects.all())
+        state = queryset.aggregate(
+            last_modified=Max('updated_at'), count=Count('pk')
+        )
+        if pk is not None and not state['count']:
+            return None, None
+        user = 0 if request.user.is_anonymous else (
+            request.user.pk, user_version(request.user.pk)
+        )
+        digest = hashlib.sha1(repr((
+            pk, normalized_params(request), state['last_modified'],
+            state['count'], user,
+        )).encode()).hexdigest()
+        return f'"{digest}"', state['last_modified']
+
+    def not_modified(self, request, etag, last_modified):
+        # Вызывается только для найденного рецепта или списка: для
+        # несуществующего рецепта If-None-Match: * не должен давать 304.
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            etags = parse_etags(if_none_match)
+            return etag in etags or '*' in etags
+        since = parse_http_date_safe(
+            request.headers.get('If-Modified-Since', '')
+        )
+        # Last-Modified не учитывает избранное и список покупок, поэтому
+        # для авторизованных пользователей проверяется только ETag.
+        return (
+            request.user.is_anonymous and since is not None
+            and last_modified is not None
+            and int(last_modified.timestamp()) <= since
+        )
+
+    def conditional_response(self, request, method, *args, **kwargs):
+        etag, last_modified = self.get_validators(request, kwargs.get('pk'))
+        self.etag = etag
+        if etag is None:
+            return method(request, *args, **kwargs)
+        if self.not_modified(request, etag, last_modified):
+            response = HttpResponseNotModified()
+        else:
+            response = method(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, super().list, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, super().retrieve, *args, **kwargs
+        )
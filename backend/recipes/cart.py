@@ -0,0 +1,79 @@
+from django.db import connection, transaction
+
+from backend.services.shoplist import invalidate_shopping_list
+from .counters import delete_rows, recount
+from .exports import cart_ingredients
+from .feed import invalidate_feeds
+from .models import Recipe, ShoppingCart
+
+
+def cart_totals(user_id):
+    """Суммарное количество каждого ингредиента в списке покупок."""
+    return [
+        {
+            'name': item['ingredient__name'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+            'amount': item['sum_amount'],
+        }
+        for item in cart_ingredients(user_id)
+    ]
+
+
+def cart_changed(user_id, recipes):
+    """
+    Запросы ниже обходят post_save/post_delete, поэтому счётчики и кэши
+    обновляются здесь: один UPDATE на все затронутые рецепты.
+    """
+    recount(
+        Recipe.objects.filter(pk__in=recipes),
+        'carts_count', ShoppingCart, 'recipe'
+    )
+    invalidate_shopping_list(user_id)
+    invalidate_feeds(user_id)
+
+
+def add_to_cart(user_id, recipes):
+    """
+    Добавляет рецепты из queryset в список покупок одним
+    INSERT ... SELECT. Уже добавленные рецепты пропускаются.
+
+    Сырой SQL вместо bulk_create(ignore_conflicts=True): рецепты не
+    загружаются в Python, а rowcount сообщает, сколько строк добавлено на
+    самом деле. post_save при этом не вызывается, поэтому carts_count,
+    кэш списка покупок и лента пересчитываются в cart_changed.
+    """
+    recipes = recipes.order_by().values('pk')
+    sql, params = recipes.query.sql_with_params()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {ShoppingCart._meta.db_table} '
+                '(user_id, recipe_id) '
+                f'SELECT %s, selected.id FROM ({sql}) selected '
+                # Без WHERE SQLite принимает ON CONFLICT за часть JOIN.
+                'WHERE true ON CONFLICT DO NOTHING',
+                (user_id, *params),
+            )
+            added = cursor.rowcount
+        cart_changed(user_id, recipes)
+    return added
+
+
+def remove_from_cart(user_id, recipe_ids=None):
+    """
+    Удаляет рецепты (или весь список покупок, если recipe_ids не задан).
+    Один SELECT находит затронутые рецепты для пересчёта счётчиков, один
+    DELETE удаляет строки без сигнала на каждую.
+    """
+    queryset = ShoppingCart.objects.filter(user=user_id)
+    if recipe_ids is not None:
+        queryset = queryset.filter(recipe_id__in=recipe_ids)
+    with transaction.atomic():
+        affected = list(queryset.values_list('recipe_id', flat=True))
+        if not affected:
+            return 0
+        removed = delete_rows(ShoppingCart.objects.filter(
+            user=user_id, recipe_id__in=affected
+        ))
+        cart_changed(user_id, affected)
+    return removed
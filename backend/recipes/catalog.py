@@ -0,0 +1,73 @@
+import hashlib
+import time
+from threading import Lock
+
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from backend.constants import CATALOG_CACHE_TIMEOUT, CATALOG_VERSION_KEY
+from .models import Ingredient, Tag
+from .serializers import IngredientSerializer, TagSerializer
+
+
+class CatalogCache:
+    """
+    Готовый JSON полного справочника и его ETag в памяти процесса.
+
+    Запись сбрасывается сигналами в текущем процессе. Остальные процессы
+    узнают об изменении по версии в общем кэше Django, а при локальном
+    кэше — по истечении CATALOG_CACHE_TIMEOUT.
+    """
+
+    def __init__(self, name, model, serializer_class):
+        self.name = name
+        self.model = model
+        self.serializer_class = serializer_class
+        self._lock = Lock()
+        self._entry = None
+
+    @property
+    def version_key(self):
+        return CATALOG_VERSION_KEY.format(name=self.name)
+
+    def _build(self, version):
+        data = self.serializer_class(self.model.objects.all(), many=True).data
+        content = JSONRenderer().render(data)
+        etag = f'"{hashlib.sha1(content).hexdigest()}"'
+        return content, etag, version, time.monotonic(), data
+
+    def _get_entry(self):
+        version = cache.get(self.version_key, 0)
+        entry = self._entry
+        if (entry is None or entry[2] != version
+                or time.monotonic() - entry[3] > CATALOG_CACHE_TIMEOUT):
+            with self._lock:
+                entry = self._entry = self._build(version)
+        return entry
+
+    def get(self):
+        entry = self._get_entry()
+        return entry[0], entry[1]
+
+    def get_data(self):
+        """Сериализованные записи справочника (только для чтения)."""
+        return self._get_entry()[4]
+
+    def reset(self):
+        self._entry = None
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.set(self.version_key, 1, None)
+
+
+tag_catalog = CatalogCache('tags', Tag, TagSerializer)
+ingredient_catalog = CatalogCache(
+    'ingredients', Ingredient, IngredientSerializer
+)
+
+
+def tag_ids_by_slug(slugs):
+    """id тегов по слагам из кэша справочника; неизвестные пропускаются."""
+    ids = {tag['slug']: tag['id'] for tag in tag_catalog.get_data()}
+    return [ids[slug] for slug in slugs if slug in ids]
@@ -0,0 +1,69 @@
+from django.apps import apps
+from django.db import connection
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно изменяет счётчик одной строки, не опуская его ниже нуля."""
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def recount(queryset, field, model, related_field):
+    """Пересчитывает счётчик строк queryset одним UPDATE."""
+    return queryset.update(**{field: count_subquery(model, related_field)})
+
+
+def delete_rows(queryset):
+    """
+    Удаляет строки queryset одним DELETE. В отличие от QuerySet.delete()
+    строки не выбираются и post_delete не отправляется: счётчики и кэши
+    обновляет вызывающий код.
+
+    Сырой SQL нужен потому, что на IngredientRecipe и ShoppingCart есть
+    приёмники post_delete: delete() для таких моделей выбирает строки и
+    отправляет сигнал на каждую, то есть пересчитывает поиск, сопоставление
+    и кэши по разу на строку. _raw_delete() — закрытый API Django.
+    Вызывающие функции обновляют всё один раз: ingredients_changed
+    для состава рецепта, cart_changed (carts_count через recount) для
+    списка покупок.
+    """
+    meta = queryset.model._meta
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {meta.db_table} WHERE {meta.pk.column} IN ({sql})',
+            params,
+        )
+        return cursor.rowcount
+
+
+def refresh_counters():
+    """Пересчитывает все денормализованные счётчики одним UPDATE на модель."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    User = apps.get_model('users', 'User')
+    Subscribe = apps.get_model('users', 'Subscribe')
+    recipes = Recipe.objects.update(
+        favorites_count=count_subquery(Favorite, 'recipe'),
+        carts_count=count_subquery(ShoppingCart, 'recipe'),
+    )
+    users = User.objects.update(
+        recipes_count=count_subquery(Recipe, 'author'),
+        followers_count=count_subquery(Subscribe, 'author'),
+    )
+    return recipes, users
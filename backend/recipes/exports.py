@@ -0,0 +1,70 @@
+import logging
+
+from django.core.files.base import ContentFile
+from django.db.models import Sum
+from django.utils import timezone
+
+from backend.services.shoplist import render_shopping_list
+from .models import IngredientRecipe, ShoppingListExport
+
+
+def cart_ingredients(user_id):
+    return (
+        IngredientRecipe.objects.filter(recipe__carts__user=user_id)
+        .values('ingredient__name', 'ingredient__measurement_unit')
+        .annotate(sum_amount=Sum('amount'))
+        .order_by('ingredient__name', 'ingredient__measurement_unit')
+    )
+
+
+def claim_exports(limit):
+    """
+    Переводит до limit выгрузок из очереди в обработку и возвращает их id.
+    Выгрузка достаётся только тому процессу, чей UPDATE её изменил, поэтому
+    несколько запущенных команд не формируют один файл дважды.
+    """
+    claimed = []
+    pending = ShoppingListExport.objects.filter(
+        status=ShoppingListExport.PENDING
+    ).order_by('created').values_list('pk', flat=True)[:limit]
+    for pk in pending:
+        if ShoppingListExport.objects.filter(
+            pk=pk, status=ShoppingListExport.PENDING
+        ).update(status=ShoppingListExport.PROCESSING):
+            claimed.append(pk)
+    return claimed
+
+
+def fail_export(pk, error):
+    """Отмечает выгрузку неудавшейся, если обработчик упал, не ответив."""
+    ShoppingListExport.objects.filter(
+        pk=pk, status=ShoppingListExport.PROCESSING
+    ).update(
+        status=ShoppingListExport.FAILED,
+        error=str(error),
+        finished=timezone.now(),
+    )
+
+
+def process_export(pk):
+    """Формирует файл выгрузки. Выполняется в процессе-обработчике."""
+    export = ShoppingListExport.objects.get(pk=pk)
+    try:
+        content = render_shopping_list(
+            cart_ingredients(export.user_id).iterator(),
+            export.file_format,
+            export.user_id,
+        )
+        export.file.save(
+            f'shopping_list_{export.pk}.{export.file_format}',
+            ContentFile(content),
+            save=False,
+        )
+        export.status = ShoppingListExport.DONE
+    except Exception as error:
+        logging.exception('Shopping list export %s failed', pk)
+        export.status = ShoppingListExport.FAILED
+        export.error = str(error)
+    export.finished = timezone.now()
+    export.save(update_fields=('file', 'status', 'error', 'finished'))
+    return pk, export.status
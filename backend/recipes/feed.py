@@ -0,0 +1,47 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from backend.constants import (
+    FEED_CACHE_KEY, FEED_CACHE_TIMEOUT, FEED_VERSION_KEY
+)
+from users.models import Subscribe
+
+
+def user_version(user_id):
+    """
+    Версия персональных данных пользователя: меняется при изменении его
+    избранного, списка покупок, подписок и рецептов его подписок. Живёт
+    не дольше ленты: без общего кэша сброс из другого процесса виден не
+    позже FEED_CACHE_TIMEOUT.
+    """
+    version_key = FEED_VERSION_KEY.format(user_id=user_id)
+    version = cache.get(version_key)
+    if version is None:
+        version = time.time_ns()
+        cache.set(version_key, version, FEED_CACHE_TIMEOUT)
+    return version
+
+
+def feed_cache_key(user_id, limit):
+    """
+    Ключ первой страницы ленты. Версия пользователя входит в ключ, поэтому
+    сброс версии делает недействительными страницы с любым limit.
+    """
+    return FEED_CACHE_KEY.format(
+        user_id=user_id, version=user_version(user_id), limit=limit or ''
+    )
+
+
+def invalidate_feeds(*user_ids):
+    """Сбрасывает ленты пользователей после фиксации транзакции."""
+    keys = [FEED_VERSION_KEY.format(user_id=user_id) for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_follower_feeds(author_id):
+    invalidate_feeds(*Subscribe.objects.filter(
+        author=author_id
+    ).values_list('user_id', flat=True))
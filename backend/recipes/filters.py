@@ -1,19 +1,41 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
-from rest_framework.filters import SearchFilter
+from django_filters.widgets import QueryArrayWidget
+from rest_framework.filters import BaseFilterBackend
 
+from backend.constants import INGREDIENTS_SEARCH_LIMIT
+from .catalog import tag_ids_by_slug
 from .models import Recipe, User
+from .search import search_ingredients, search_recipes
 
 
 class RecipeFilter(filters.FilterSet):
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.Filter(method='filter_tags', widget=QueryArrayWidget)
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart']
+        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'search']
+
+    def filter_tags(self, queryset, name, value):
+        """
+        Рецепты хотя бы с одним из тегов. Подзапрос EXISTS по связующей
+        таблице не размножает строки рецептов, как JOIN, и не требует
+        DISTINCT.
+        """
+        if not value:
+            return queryset
+        tag_ids = tag_ids_by_slug(value)
+        if not tag_ids:
+            return queryset.none()
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'), tag_id__in=tag_ids
+        )))
 
     def filter_by_user_relation(self, queryset, name, relation_name):
         if self.request.user.is_authenticated:
@@ -36,6 +58,19 @@ class RecipeFilter(filters.FilterSet):
             return self.filter_by_user_relation(queryset, name, 'carts')
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if value:
+            return search_recipes(queryset, value)
+        return queryset
 
-class IngredientFilter(SearchFilter):
+
+class IngredientFilter(BaseFilterBackend):
     search_param = 'name'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        limit = INGREDIENTS_SEARCH_LIMIT if view.action == 'list' else None
+        return search_ingredients(queryset, query, limit)
@@ -0,0 +1,118 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from backend.constants import (
+    IMAGE_FORMAT,
+    IMAGE_QUALITY,
+    IMAGE_MAX_SIZE,
+    IMAGE_VARIANTS,
+    IMAGE_WORKERS,
+)
+
+from .caching import bump_recipes_version
+from .models import Recipe
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+def encode(image, size):
+    """Уменьшает копию изображения до size и кодирует без метаданных."""
+    image = image.copy()
+    image.thumbnail(size, Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, IMAGE_FORMAT, quality=IMAGE_QUALITY, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def load(file):
+    """
+    Открывает загруженный файл один раз: поворачивает по EXIF и приводит
+    к RGB. Новое изображение создаётся без EXIF и прочих метаданных.
+    """
+    file.seek(0)
+    with Image.open(file) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info
+                                  else 'RGB')
+        if IMAGE_FORMAT == 'JPEG' and image.mode == 'RGBA':
+            image = image.convert('RGB')
+        image.load()
+    return image
+
+
+def process_recipe_image(recipe):
+    """
+    Перекодирует изображение рецепта с ограничением размера и создаёт
+    уменьшенные копии для карточки и страницы рецепта.
+    """
+    image = load(recipe.image)
+    original = recipe.image.name
+    name = os.path.splitext(os.path.basename(original))[0]
+    extension = EXTENSIONS[IMAGE_FORMAT]
+    recipe.image.save(
+        f'{name}.{extension}', encode(image, IMAGE_MAX_SIZE), save=False
+    )
+    for field, size in IMAGE_VARIANTS.items():
+        getattr(recipe, field).save(
+            f'{name}_{size[0]}.{extension}', encode(image, size), save=False
+        )
+    variants = {field: getattr(recipe, field).name for field in IMAGE_VARIANTS}
+    updated = Recipe.objects.filter(pk=recipe.pk, image=original).update(
+        image=recipe.image.name, image_status=Recipe.IMAGE_READY,
+        updated_at=timezone.now(), **variants
+    )
+    if not updated:
+        # Пока шла обработка, рецепту загрузили другое изображение.
+        for path in (recipe.image.name, *variants.values()):
+            recipe.image.storage.delete(path)
+        return
+    if recipe.image.name != original:
+        recipe.image.storage.delete(original)
+    recipe.image_status = Recipe.IMAGE_READY
+    bump_recipes_version()
+
+
+executor = ThreadPoolExecutor(
+    max_workers=IMAGE_WORKERS, thread_name_prefix='recipe-images'
+)
+
+
+def process_in_background(pk, image_name):
+    """
+    Обрабатывает изображение в потоке пула. Если за это время рецепту
+    загрузили другое изображение, задача ничего не делает: новое
+    изображение обработает своя задача.
+    """
+    close_old_connections()
+    try:
+        recipe = Recipe.objects.filter(pk=pk, image=image_name).first()
+        if recipe is None:
+            return
+        try:
+            process_recipe_image(recipe)
+        except Exception:
+            logging.exception('Recipe %s image processing failed', pk)
+            Recipe.objects.filter(pk=pk, image=image_name).update(
+                image_status=Recipe.IMAGE_FAILED
+            )
+    finally:
+        close_old_connections()
+
+
+def schedule_recipe_image(recipe):
+    """
+    Ставит обработку изображения в очередь после фиксации транзакции,
+    чтобы тяжёлая работа Pillow не удерживала транзакцию записи рецепта.
+    """
+    pk, image_name = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: executor.submit(process_in_background, pk, image_name)
+    )
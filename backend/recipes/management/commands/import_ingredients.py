@@ -1,33 +1,154 @@
 import csv
+import json
 import logging
+import os
+import re
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from backend.constants import (
+    INGREDIENTS_IMPORT_BATCH_SIZE, INGREDIENTS_IMPORT_READ_SIZE
+)
+from recipes.catalog import ingredient_catalog
 from recipes.models import Ingredient
+from recipes.search import ingredient_index
 
 logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
 
 
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0].strip(), row[1].strip()
+
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def iter_json_array(file, size=INGREDIENTS_IMPORT_READ_SIZE):
+    """
+    Элементы JSON-массива верхнего уровня по одному. Файл читается
+    кусками по size символов: в памяти только текущий кусок и
+    недочитанный элемент, а не весь разобранный список.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    expected = '['
+    while True:
+        position = WHITESPACE.match(buffer, position).end()
+        if position == len(buffer):
+            buffer, position = file.read(size), 0
+            if not buffer:
+                raise CommandError('JSON-файл оборвался до конца массива')
+            continue
+        char = buffer[position]
+        if char == ']' and expected in ('first', ','):
+            return
+        if expected in ('[', ','):
+            if char != expected:
+                raise CommandError(
+                    f'Ожидался «{expected}» в JSON-файле, найдено «{char}»'
+                )
+            position += 1
+            # Сразу после «[» массив может закончиться, после «,» — нет.
+            expected = 'first' if expected == '[' else 'item'
+            continue
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as error:
+                chunk = file.read(size)
+                if not chunk:
+                    raise CommandError(f'Некорректный JSON-файл: {error}')
+            else:
+                if end < len(buffer) and buffer[end] in ',] \t\n\r':
+                    break
+                # Число на границе куска может продолжаться в следующем:
+                # «12» из «12.5».
+                chunk = file.read(size)
+                if not chunk:
+                    break
+            buffer, position = buffer[position:] + chunk, 0
+        yield item
+        position = end
+        expected = ','
+
+
+def read_json(file):
+    for item in iter_json_array(file):
+        yield item['name'].strip(), item['measurement_unit'].strip()
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
 class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты из CSV или JSON файла. '
+        'Уже существующие ингредиенты и связи с рецептами сохраняются.'
+    )
+
     def add_arguments(self, parser):
         parser.add_argument(
             'file_path',
             type=str,
-            help="Path to the ingredients CSV file")
+            help="Path to the ingredients CSV or JSON file")
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=INGREDIENTS_IMPORT_BATCH_SIZE,
+            help='Number of rows inserted per query')
 
     def handle(self, *args, **options):
         file_path = options['file_path']
-        Ingredient.objects.all().delete()
-        logging.info(' Модель Ingredient базы данных очищена.')
-
-        with open(file_path, encoding='utf-8') as file:
-            reader = csv.reader(file)
-            counter = 0
-            for row in reader:
-                if counter % 100 == 0:
-                    logging.info(f' Добавлен ингридиент {row[0]}')
-                Ingredient.objects.create(name=row[0], measurement_unit=row[1])
-                counter += 1
+        batch_size = options['batch_size']
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension not in READERS:
+            raise CommandError(
+                f'Неподдерживаемый формат файла: {extension or file_path}'
+            )
+
+        started = time.perf_counter()
+        processed = 0
+        with open(file_path, encoding='utf-8') as file, transaction.atomic():
+            existing = Ingredient.objects.count()
+            for chunk in chunked(READERS[extension](file), batch_size):
+                Ingredient.objects.bulk_create(
+                    (
+                        Ingredient(name=name, measurement_unit=unit)
+                        for name, unit in chunk
+                    ),
+                    batch_size=batch_size,
+                    ignore_conflicts=True,
+                )
+                processed += len(chunk)
+                logging.info(f' Обработано строк: {processed}')
+            created = Ingredient.objects.count() - existing
+        ingredient_index.reset()
+        ingredient_catalog.reset()
+        elapsed = time.perf_counter() - started
+
+        logging.info(
+            f' В базу данных успешно добавлены ингредиенты - {created} шт. '
+            f'(пропущено существующих - {processed - created} шт.)'
+        )
         logging.info(
-            f' В базу данных успешно добавлены ингредиенты - {counter} шт.'
+            f' Время загрузки: {elapsed:.3f} с, '
+            f'{processed / elapsed if elapsed else processed:.0f} строк/с'
         )
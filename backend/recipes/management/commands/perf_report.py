@@ -0,0 +1,80 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend.services.metrics import load_reports, summarize
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает p50/p95/p99 времени ответа, времени БД, '
+        'сериализаторов и числа запросов по каждому view/action, '
+        'от самых медленных.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the report as JSON')
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Number of slowest endpoints to show')
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Delete collected samples after printing')
+
+    def handle(self, *args, **options):
+        directory = settings.PERF_REPORT_DIR
+        endpoints, counters = load_reports(directory)
+        report = {
+            endpoint: summarize(stats)
+            for endpoint, stats in endpoints.items()
+        }
+        for values in counters.values():
+            if 'misses' in values:
+                hits = sum(
+                    value for name, value in values.items()
+                    if name.endswith('hits')
+                )
+                lookups = hits + values['misses']
+                values['hit_rate'] = (
+                    round(hits / lookups, 4) if lookups else 0
+                )
+        slowest = sorted(
+            report.items(), key=lambda item: item[1]['total']['p95'],
+            reverse=True
+        )[:options['limit']]
+        if options['json']:
+            self.stdout.write(json.dumps(
+                {'endpoints': dict(slowest), 'counters': counters}, indent=2
+            ))
+        else:
+            self.stdout.write(
+                f'{"endpoint":<50} {"count":>7} {"p50 ms":>8} '
+                f'{"p95 ms":>8} {"p99 ms":>8} {"db p95":>8} '
+                f'{"ser p95":>8} {"q p95":>6}'
+            )
+            for endpoint, stats in slowest:
+                self.stdout.write(
+                    f'{endpoint:<50} {stats["count"]:>7} '
+                    f'{stats["total"]["p50"]:>8.1f} '
+                    f'{stats["total"]["p95"]:>8.1f} '
+                    f'{stats["total"]["p99"]:>8.1f} '
+                    f'{stats["db"]["p95"]:>8.1f} '
+                    f'{stats["serializer"]["p95"]:>8.1f} '
+                    f'{stats["queries"]["p95"]:>6}'
+                )
+            for group, values in counters.items():
+                self.stdout.write(f'\n{group}')
+                for counter, value in values.items():
+                    self.stdout.write(f'  {counter}: {value}')
+        if options['reset'] and os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(directory, name))
@@ -0,0 +1,37 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
+
+
+class Command(BaseCommand):
+    help = (
+        'Перекодирует изображения рецептов и создаёт уменьшенные копии '
+        'для рецептов, у которых их ещё нет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Reprocess recipes that already have image variants')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_card='')
+        processed = failed = 0
+        for recipe in recipes.iterator():
+            try:
+                process_recipe_image(recipe)
+                processed += 1
+            except (OSError, ValueError):
+                logging.exception(f' Не удалось обработать рецепт {recipe.pk}')
+                failed += 1
+        logging.info(
+            f' Обработано изображений: {processed}, с ошибками: {failed}'
+        )
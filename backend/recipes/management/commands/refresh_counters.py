@@ -0,0 +1,23 @@
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import refresh_counters
+
+logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики избранного, списков покупок, '
+        'рецептов и подписчиков.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recipes, users = refresh_counters()
+        logging.info(
+            f' Счётчики пересчитаны: рецептов - {recipes}, '
+            f'пользователей - {users}.'
+        )
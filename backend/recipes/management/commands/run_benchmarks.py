@@ -0,0 +1,291 @@
+import json
+import logging
+import math
+import time
+import tracemalloc
+from functools import partial
+from urllib.parse import urlencode, urlparse
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.pagination import Cursor
+
+from backend.services.metrics import percentile
+from backend.services.shoplist import invalidate_shopping_list
+from recipes.caching import bump_recipes_version
+from recipes.cart import cart_changed
+from recipes.feed import invalidate_feeds
+from recipes.models import Ingredient, Recipe, ShoppingCart, Tag
+from recipes.paginations import RecipeCursorPagination
+from users.models import User
+
+logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
+
+CART_SIZES = (10, 100, 1000)
+CART_FORMATS = ('txt', 'csv', 'pdf')
+IMAGE_FIELDS = ('image', 'image_card')
+
+
+def scenarios(recipe, author, tags, ingredient, deep_page, deep_cursor):
+    """
+    Имя сценария -> (путь, учётная запись): None — анонимный запрос,
+    'user' — самый активный пользователь, 'cart_N' — пользователь с N
+    рецептами в списке покупок. Сценарии с суффиксом .cached меряют
+    попадание в кэш ответов, остальные сбрасывают его перед каждым
+    запросом.
+    """
+    tag_query = urlencode([('tags', slug) for slug in tags])
+    selected = {
+        'recipes.list': ('/api/recipes/', None),
+        'recipes.list.cached': ('/api/recipes/', None),
+        'recipes.list.page_50': ('/api/recipes/?page=50', None),
+        'recipes.list.cursor': ('/api/recipes/?cursor=', None),
+        'recipes.list.page_deep': (
+            f'/api/recipes/?page={deep_page}', 'user'),
+        'recipes.list.cursor_deep': (deep_cursor, 'user'),
+        'recipes.list.auth': ('/api/recipes/', 'user'),
+        'recipes.detail': (f'/api/recipes/{recipe}/', None),
+        'recipes.filter.tags': (f'/api/recipes/?{tag_query}', None),
+        'recipes.filter.author': (f'/api/recipes/?author={author}', None),
+        'recipes.filter.is_favorited': (
+            '/api/recipes/?is_favorited=1', 'user'),
+        'recipes.search': (
+            f'/api/recipes/?{urlencode({"search": "суп"})}', None),
+        'recipes.feed': ('/api/recipes/feed/', 'user'),
+        'recipes.feed.cached': ('/api/recipes/feed/', 'user'),
+        'users.subscriptions': (
+            '/api/users/subscriptions/?recipes_limit=3', 'user'),
+        'ingredients.search': (
+            f'/api/ingredients/?{urlencode({"name": ingredient})}', None),
+    }
+    for size in CART_SIZES:
+        for file_format in CART_FORMATS:
+            selected[f'cart.download.{file_format}.{size}'] = (
+                '/api/recipes/download_shopping_cart/'
+                f'?format={file_format}',
+                f'cart_{size}'
+            )
+    return selected
+
+
+def cart_user(size):
+    """
+    Пользователь, в списке покупок которого ровно size последних рецептов.
+    """
+    user, _ = User.objects.get_or_create(
+        username=f'bench_cart_{size}',
+        defaults={
+            'email': f'bench_cart_{size}@foodgram.local',
+            'first_name': 'Bench', 'last_name': str(size),
+        }
+    )
+    recipe_ids = list(Recipe.objects.order_by(
+        '-pub_date', '-id'
+    ).values_list('pk', flat=True)[:size])
+    stale = list(ShoppingCart.objects.filter(user=user).exclude(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+    ShoppingCart.objects.filter(user=user, recipe_id__in=stale).delete()
+    ShoppingCart.objects.bulk_create(
+        (ShoppingCart(user=user, recipe_id=pk) for pk in recipe_ids),
+        ignore_conflicts=True
+    )
+    cart_changed(user.pk, recipe_ids + stale)
+    return user
+
+
+def drop_cached_responses(user_ids):
+    """
+    Новая версия рецептов и версии пользователей: следующий запрос идёт
+    мимо кэша анонимных ответов и лент. Индексы и каталоги не трогаются.
+    """
+    bump_recipes_version()
+    invalidate_feeds(*user_ids)
+
+
+def drop_cached_shopping_list(user_id):
+    """Список покупок строится заново, иначе PDF отдаётся из кэша."""
+    drop_cached_responses((user_id,))
+    invalidate_shopping_list(user_id)
+
+
+def deep_pages(page):
+    """
+    Номер глубокой страницы (не дальше последней) и курсор, ведущий на ту
+    же страницу ленты без OFFSET.
+    """
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    page = max(1, min(page, math.ceil(Recipe.objects.count() / page_size)))
+    if page == 1:
+        return page, '/api/recipes/?cursor='
+    paginator = RecipeCursorPagination()
+    paginator.base_url = '/api/recipes/'
+    previous = Recipe.objects.order_by(
+        *paginator.ordering
+    )[(page - 1) * page_size - 1]
+    position = paginator._get_position_from_instance(
+        previous, paginator.ordering
+    )
+    return page, paginator.encode_cursor(
+        Cursor(offset=0, reverse=False, position=position)
+    )
+
+
+def token_client(user):
+    token, _ = Token.objects.get_or_create(user=user)
+    return Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+
+def consume(response):
+    """Дочитывает ответ; возвращает статус и размер тела в байтах."""
+    if response.streaming:
+        return response.status_code, sum(
+            len(chunk) for chunk in response.streaming_content
+        )
+    return response.status_code, len(response.content)
+
+
+def image_bytes(response):
+    """
+    Суммарный размер изображений, на которые ссылается страница списка:
+    оригиналов и уменьшенных копий для карточек. Файлы, которых нет в
+    хранилище, не учитываются.
+    """
+    if response.streaming or response.get('Content-Type') != (
+            'application/json'):
+        return None
+    data = response.json()
+    items = data.get('results', []) if isinstance(data, dict) else data
+    totals = dict.fromkeys(IMAGE_FIELDS, 0)
+    prefix = '/' + settings.MEDIA_URL.lstrip('/')
+    for item in items:
+        for field in IMAGE_FIELDS:
+            path = urlparse(item.get(field) or '').path
+            if not path.startswith(prefix):
+                continue
+            name = path[len(prefix):]
+            if default_storage.exists(name):
+                totals[field] += default_storage.size(name)
+    return totals
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет основные запросы API через тестовый клиент Django и '
+        'выводит JSON с p50/p95 времени, числом SQL-запросов, размером '
+        'ответа и пиковой памятью по каждому сценарию. Данные готовит '
+        'seed_synthetic.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations', type=int, default=20,
+            help='Timed requests per scenario')
+        parser.add_argument(
+            '--only', nargs='*', default=None,
+            help='Scenario names to run')
+        parser.add_argument(
+            '--deep-page', type=int, default=1000,
+            help='Page number for the deep page and cursor scenarios')
+        parser.add_argument(
+            '--output', default=None,
+            help='Write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        user = User.objects.annotate(
+            subscriptions=Count('follower')
+        ).order_by('-subscriptions').first()
+        recipe = Recipe.objects.order_by('-favorites_count').first()
+        if user is None or recipe is None:
+            raise CommandError(
+                'База пуста: сначала выполните manage.py seed_synthetic'
+            )
+        author = User.objects.order_by('-recipes_count').first()
+        tags = list(Tag.objects.values_list('slug', flat=True)[:3])
+        ingredient = (Ingredient.objects.values_list(
+            'name', flat=True
+        ).first() or 'а')[:2]
+        selected = scenarios(
+            recipe.pk, author.pk, tags, ingredient,
+            *deep_pages(options['deep_page'])
+        )
+        if options['only']:
+            selected = {
+                name: scenario for name, scenario in selected.items()
+                if name in options['only']
+            }
+
+        users = {None: None, 'user': user}
+        users.update(
+            (account, cart_user(int(account[len('cart_'):])))
+            for _, account in selected.values()
+            if account and account.startswith('cart_')
+        )
+        clients = {
+            account: token_client(account_user) if account_user else Client()
+            for account, account_user in users.items()
+        }
+        report = {}
+        with override_settings(ALLOWED_HOSTS=['*'], DEBUG=False):
+            for name, (path, account) in selected.items():
+                prepare = None
+                if account and account.startswith('cart_'):
+                    prepare = partial(
+                        drop_cached_shopping_list, users[account].pk
+                    )
+                elif not name.endswith('.cached'):
+                    prepare = partial(drop_cached_responses, [user.pk])
+                report[name] = self.measure(
+                    clients[account], path, options['iterations'], prepare
+                )
+                logging.info(
+                    f' {name}: p50 {report[name]["p50_ms"]:.1f} мс, '
+                    f'запросов {report[name]["queries"]}, '
+                    f'{report[name]["bytes"]} байт'
+                )
+        content = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(content)
+        else:
+            self.stdout.write(content)
+
+    @staticmethod
+    def measure(client, path, iterations, prepare=None):
+        prepare = prepare or (lambda: None)
+        response = client.get(path)
+        images = image_bytes(response)
+        consume(response)
+        timings = []
+        for _ in range(iterations):
+            prepare()
+            started = time.perf_counter()
+            status, size = consume(client.get(path))
+            timings.append((time.perf_counter() - started) * 1000)
+        prepare()
+        with CaptureQueriesContext(connection) as queries:
+            consume(client.get(path))
+        # Журнал запросов очищается в начале следующего запроса,
+        # поэтому число фиксируется сразу.
+        query_count = len(queries)
+        prepare()
+        tracemalloc.start()
+        consume(client.get(path))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            'path': path,
+            'status': status,
+            'p50_ms': percentile(timings, 0.5),
+            'p95_ms': percentile(timings, 0.95),
+            'queries': query_count,
+            'bytes': size,
+            'image_bytes': images,
+            'peak_memory_kib': peak // 1024,
+        }
@@ -0,0 +1,72 @@
+import logging
+import os
+import time
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from backend.constants import EXPORT_WORKERS_POLL_INTERVAL
+from recipes.exports import claim_exports, fail_export, process_export
+
+logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает пул процессов, формирующих файлы списков покупок '
+        'из очереди выгрузок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes')
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=EXPORT_WORKERS_POLL_INTERVAL,
+            help='Seconds to wait when the queue is empty')
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the current queue and exit')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        # Дочерние процессы не должны делить соединение с родителем.
+        connections.close_all()
+        with Pool(workers) as pool:
+            logging.info(f' Запущено обработчиков: {workers}')
+            in_flight = set()
+            while True:
+                claimed = claim_exports(workers * 2 - len(in_flight))
+                for pk in claimed:
+                    in_flight.add(pk)
+                    pool.apply_async(
+                        process_export, (pk,),
+                        callback=self.done(in_flight),
+                        error_callback=self.failed(in_flight, pk),
+                    )
+                if not claimed:
+                    if options['once'] and not in_flight:
+                        break
+                    time.sleep(options['poll_interval'])
+
+    @staticmethod
+    def done(in_flight):
+        def callback(result):
+            pk, status = result
+            in_flight.discard(pk)
+            logging.info(f' Выгрузка {pk}: {status}')
+        return callback
+
+    @staticmethod
+    def failed(in_flight, pk):
+        def callback(error):
+            in_flight.discard(pk)
+            logging.error(f' Выгрузка {pk} прервана: {error}')
+            fail_export(pk, error)
+        return callback
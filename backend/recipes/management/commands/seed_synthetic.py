@@ -0,0 +1,305 @@
+import io
+import logging
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image, ImageFilter
+
+from recipes.caching import bump_recipes_version
+from recipes.catalog import ingredient_catalog, tag_catalog
+from recipes.counters import refresh_counters
+from recipes.management.commands.import_ingredients import chunked
+from recipes.matching import ingredient_matcher
+from recipes.models import (
+    Favorite, Ingredient, IngredientRecipe, Recipe, ShoppingCart, Tag
+)
+from recipes.search import ingredient_index, update_search_vectors
+from users.models import Subscribe, User
+
+logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
+
+WORDS = (
+    'суп', 'салат', 'пирог', 'рагу', 'каша', 'омлет', 'паста', 'плов',
+    'запеканка', 'котлеты', 'блины', 'соус', 'десерт', 'похлёбка',
+)
+# Размер и качество синтетических «фотографий» для --images: порядок
+# величины снимка с телефона после загрузки через base64.
+PHOTO_SIZE = (2400, 1600)
+PHOTO_QUALITY = 92
+ADJECTIVES = (
+    'домашний', 'быстрый', 'летний', 'острый', 'сливочный', 'овощной',
+    'праздничный', 'постный', 'сытный', 'лёгкий',
+)
+
+
+class Zipf:
+    """Выбор элементов с частотой, обратной рангу в степени exponent."""
+
+    def __init__(self, items, exponent, rng):
+        self.items = list(items)
+        self.rng = rng
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)
+        ))
+
+    def sample(self, count):
+        return self.rng.choices(
+            self.items, cum_weights=self.cum_weights, k=count
+        )
+
+    def unique(self, count, exclude=None):
+        count = min(count, len(self.items) - (exclude is not None))
+        chosen = set()
+        while len(chosen) < count:
+            chosen.update(
+                item for item in self.sample(count - len(chosen))
+                if item != exclude
+            )
+        return chosen
+
+
+def new_ids(model, previous):
+    """id строк, вставленных после previous (bulk_create на SQLite их не
+    возвращает)."""
+    return list(model.objects.filter(pk__gt=previous).order_by('pk')
+                .values_list('pk', flat=True))
+
+
+def max_id(model):
+    return model.objects.aggregate(value=Max('pk'))['value'] or 0
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, рецептами, '
+        'избранным, списками покупок и подписками с перекосом популярности '
+        '(закон Ципфа) для нагрузочных замеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=8)
+        parser.add_argument(
+            '--ingredients', type=int, default=500,
+            help='Synthetic ingredients to create if the catalog is empty')
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument(
+            '--favorites-per-user', type=int, default=20)
+        parser.add_argument('--carts-per-user', type=int, default=5)
+        parser.add_argument(
+            '--subscriptions-per-user', type=int, default=10)
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Popularity skew of authors, recipes and ingredients')
+        parser.add_argument(
+            '--images', type=int, default=0,
+            help='Newest recipes that get a generated JPEG photo instead '
+                 'of the placeholder path; process them with '
+                 'process_recipe_images')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.zipf = options['zipf']
+        started = time.perf_counter()
+
+        tag_ids = self.seed_tags(options['tags'])
+        ingredient_ids = self.seed_ingredients(options['ingredients'])
+        user_ids = self.seed_users(options['users'])
+        authors = Zipf(user_ids, self.zipf, self.rng)
+        recipe_ids = self.seed_recipes(options['recipes'], authors)
+        if options['images']:
+            self.seed_images(recipe_ids[-options['images']:])
+        self.seed_recipe_relations(
+            recipe_ids, tag_ids, ingredient_ids,
+            options['ingredients_per_recipe']
+        )
+        popular = Zipf(reversed(recipe_ids), self.zipf, self.rng)
+        for model, per_user in (
+            (Favorite, options['favorites_per_user']),
+            (ShoppingCart, options['carts_per_user']),
+        ):
+            self.seed_user_recipes(model, user_ids, popular, per_user)
+        self.seed_subscriptions(
+            user_ids, authors, options['subscriptions_per_user']
+        )
+
+        with transaction.atomic():
+            refresh_counters()
+        update_search_vectors()
+        for index in (ingredient_index, ingredient_catalog, tag_catalog,
+                      ingredient_matcher):
+            index.reset()
+        bump_recipes_version()
+        logging.info(
+            f' Синтетические данные созданы за '
+            f'{time.perf_counter() - started:.1f} с'
+        )
+
+    def bulk_create(self, model, rows, label):
+        created = 0
+        for chunk in chunked(rows, self.batch_size):
+            model.objects.bulk_create(
+                chunk, batch_size=self.batch_size, ignore_conflicts=True
+            )
+            created += len(chunk)
+        logging.info(f' {label}: {created}')
+
+    def seed_tags(self, count):
+        existing = Tag.objects.count()
+        start = max_id(Tag)
+        self.bulk_create(Tag, (
+            Tag(
+                name=f'Тег {start + number}',
+                slug=f'tag-{start + number}',
+                color=f'#{self.rng.randrange(1 << 24):06X}',
+            )
+            for number in range(1, count - existing + 1)
+        ), 'Теги')
+        return list(Tag.objects.values_list('pk', flat=True))
+
+    def seed_ingredients(self, count):
+        if not Ingredient.objects.exists():
+            self.bulk_create(Ingredient, (
+                Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+                for number in range(1, count + 1)
+            ), 'Ингредиенты')
+        return list(Ingredient.objects.values_list('pk', flat=True))
+
+    def seed_users(self, count):
+        start = max_id(User)
+        password = make_password(None)
+        self.bulk_create(User, (
+            User(
+                username=f'user{start + number}',
+                email=f'user{start + number}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password,
+            )
+            for number in range(1, count + 1)
+        ), 'Пользователи')
+        return new_ids(User, start)
+
+    def seed_recipes(self, count, authors):
+        start = max_id(Recipe)
+        self.bulk_create(Recipe, (
+            Recipe(
+                author_id=author_id,
+                name=(f'{self.rng.choice(ADJECTIVES).capitalize()} '
+                      f'{self.rng.choice(WORDS)} {start + number}'),
+                text=' '.join(self.rng.choices(WORDS + ADJECTIVES, k=30)),
+                cooking_time=self.rng.randint(5, 180),
+                image='recipes/images/synthetic.jpg',
+            )
+            for number, author_id in enumerate(authors.sample(count), 1)
+        ), 'Рецепты')
+        recipe_ids = new_ids(Recipe, start)
+        # auto_now_add ставит всем рецептам одно время: разносим даты
+        # публикации, чтобы лента и курсорная пагинация были реалистичны.
+        now = timezone.now()
+        total = len(recipe_ids)
+        for offset in range(0, total, self.batch_size):
+            Recipe.objects.bulk_update(
+                [
+                    Recipe(pk=pk, pub_date=now - timedelta(
+                        minutes=total - position
+                    ))
+                    for position, pk in enumerate(
+                        recipe_ids[offset:offset + self.batch_size], offset
+                    )
+                ],
+                ('pub_date',),
+            )
+        return recipe_ids
+
+    def seed_recipe_relations(self, recipe_ids, tag_ids, ingredient_ids,
+                              per_recipe):
+        ingredients = Zipf(ingredient_ids, self.zipf, self.rng)
+        self.bulk_create(IngredientRecipe, (
+            IngredientRecipe(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=self.rng.randint(1, 500),
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in ingredients.unique(
+                self.rng.randint(max(per_recipe // 2, 1), per_recipe)
+            )
+        ), 'Ингредиенты рецептов')
+        through = Recipe.tags.through
+        self.bulk_create(through, (
+            through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.rng.sample(
+                tag_ids, min(len(tag_ids), self.rng.randint(1, 3))
+            )
+        ), 'Теги рецептов')
+
+    def seed_user_recipes(self, model, user_ids, recipes, per_user):
+        self.bulk_create(model, (
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in recipes.unique(self.rng.randint(0, per_user))
+        ), model._meta.verbose_name_plural)
+
+    def seed_subscriptions(self, user_ids, authors, per_user):
+        self.bulk_create(Subscribe, (
+            Subscribe(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in authors.unique(
+                self.rng.randint(0, per_user), exclude=user_id
+            )
+        ), 'Подписки')
+
+    def photo(self):
+        """
+        JPEG с шумом и градиентами: сжимается примерно как фотография, а
+        не как однотонная заливка.
+        """
+        bands = [
+            Image.blend(
+                Image.effect_noise(PHOTO_SIZE, 60).filter(
+                    ImageFilter.GaussianBlur(1.2)
+                ),
+                Image.linear_gradient('L').resize(PHOTO_SIZE).rotate(
+                    self.rng.randrange(360)
+                ),
+                0.5,
+            )
+            for _ in range(3)
+        ]
+        buffer = io.BytesIO()
+        Image.merge('RGB', bands).save(
+            buffer, 'JPEG', quality=PHOTO_QUALITY
+        )
+        return ContentFile(buffer.getvalue())
+
+    def seed_images(self, recipe_ids):
+        """
+        Своё исходное изображение у каждого рецепта: process_recipe_images
+        заменяет оригинал перекодированной копией и удаляет его.
+        """
+        for recipe_id in recipe_ids:
+            name = default_storage.save(
+                f'recipes/images/synthetic_{recipe_id}.jpg', self.photo()
+            )
+            Recipe.objects.filter(pk=recipe_id).update(
+                image=name, image_card='', image_detail=''
+            )
+        logging.info(f' Изображения рецептов: {len(recipe_ids)}')
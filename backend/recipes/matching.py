@@ -0,0 +1,322 @@
+import time
+from array import array
+from threading import RLock, local
+
+from django.core.cache import cache
+from django.db import transaction
+
+from backend.constants import (
+    MATCH_CHANGE_KEY,
+    MATCH_INDEX_TIMEOUT,
+    MATCH_SYNC_MAX_CHANGES,
+    MATCH_VERSION_KEY,
+)
+from .models import IngredientRecipe, Recipe
+
+
+def bitmap(positions, size):
+    """Собирает битовую карту из номеров позиций за один проход."""
+    buffer = bytearray((size >> 3) + 1)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def add_to_planes(planes, bits):
+    """Прибавляет 1 к побитовым счётчикам (plane i — i-й бит счётчика)."""
+    for index, plane in enumerate(planes):
+        planes[index] = plane ^ bits
+        bits &= plane
+        if not bits:
+            return
+    planes.append(bits)
+
+
+def subtract_planes(minuend, subtrahend):
+    """Вычитает побитовые счётчики; subtrahend не больше minuend."""
+    result = []
+    borrow = 0
+    for index, left in enumerate(minuend):
+        right = subtrahend[index] if index < len(subtrahend) else 0
+        result.append(left ^ right ^ borrow)
+        borrow = (~left & (right | borrow)) | (right & borrow)
+    return result
+
+
+def equals_mask(planes, value, mask):
+    """Позиции из mask, где побитовый счётчик равен value."""
+    for index, plane in enumerate(planes):
+        mask &= plane if value >> index & 1 else ~plane
+    return mask if value < 1 << len(planes) else 0
+
+
+def build_state(version, recipe_ids, rows):
+    """
+    Индекс по id рецептов в порядке возрастания и парам (id рецепта, id
+    ингредиента), упорядоченным по id рецепта.
+    """
+    recipe_ids = array('q', recipe_ids)
+    positions = {pk: position for position, pk in enumerate(recipe_ids)}
+    totals = array('H', bytes(2 * len(recipe_ids)))
+    items = array('q')
+    ingredients = {}
+    for recipe_id, ingredient_id in rows:
+        position = positions.get(recipe_id)
+        if position is None:
+            continue
+        totals[position] += 1
+        items.append(ingredient_id)
+        ingredients.setdefault(ingredient_id, []).append(position)
+    # Ингредиенты рецепта по позиции: items[offsets[p]:offsets[p + 1]].
+    offsets = array('Q', [0])
+    for total in totals:
+        offsets.append(offsets[-1] + total)
+    size = len(recipe_ids)
+    planes = [
+        bitmap((position for position, total in enumerate(totals)
+                if total >> index & 1), size)
+        for index in range(max(totals, default=0).bit_length())
+    ]
+    return {
+        'version': version,
+        'built': time.monotonic(),
+        'recipe_ids': recipe_ids,
+        'positions': positions,
+        'totals': totals,
+        'offsets': offsets,
+        'items': items,
+        # Составы рецептов, изменённых после построения индекса.
+        'overrides': {},
+        'planes': planes,
+        'alive': (1 << size) - 1,
+        'bitmaps': {
+            ingredient_id: bitmap(members, size)
+            for ingredient_id, members in ingredients.items()
+        },
+    }
+
+
+class IngredientMatcher:
+    """
+    Обратный индекс ингредиент -> битовая карта рецептов в памяти процесса.
+
+    Каждому рецепту назначается позиция, число его ингредиентов хранится
+    побитовыми счётчиками. Для набора ингредиентов пользователя счётчики
+    совпадений складываются сразу по всем рецептам операциями над int,
+    поэтому запрос не перебирает рецепты по одному.
+
+    Изменения рецептов применяются точечно после фиксации транзакции: в
+    своём процессе сразу, в остальных — по журналу изменений в кэше
+    Django. Журнал виден другим процессам только при общем кэше; с
+    локальным кэшем по умолчанию они увидят изменения после перестройки
+    индекса через MATCH_INDEX_TIMEOUT.
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._state = None
+        self._pending = local()
+
+    def _build(self):
+        return build_state(
+            cache.get(MATCH_VERSION_KEY, 0),
+            Recipe.objects.order_by('pk').values_list('pk', flat=True),
+            IngredientRecipe.objects.order_by('recipe_id').values_list(
+                'recipe_id', 'ingredient_id'
+            ).iterator(),
+        )
+
+    def _get_state(self):
+        state = self._state
+        if (state is None
+                or time.monotonic() - state['built'] > MATCH_INDEX_TIMEOUT):
+            with self._lock:
+                if self._state is state:
+                    self._state = self._build()
+                state = self._state
+        return self._sync(state)
+
+    def _sync(self, state):
+        version = cache.get(MATCH_VERSION_KEY, 0)
+        if version == state['version']:
+            return state
+        with self._lock:
+            missing = range(state['version'] + 1, version + 1)
+            keys = [MATCH_CHANGE_KEY.format(version=item) for item in missing]
+            changes = cache.get_many(keys)
+            # Последние записи могут быть ещё не сохранены после incr:
+            # применяются изменения до первой отсутствующей.
+            available = 0
+            while available < len(keys) and keys[available] in changes:
+                available += 1
+            if (version < state['version']
+                    or len(changes) != available
+                    or len(missing) > MATCH_SYNC_MAX_CHANGES):
+                state = self._state = self._build()
+                return state
+            if not available:
+                return state
+            self._apply(state, {
+                recipe_id
+                for key in keys[:available] for recipe_id in changes[key]
+            })
+            state['version'] += available
+        return state
+
+    def _apply(self, state, recipe_ids):
+        rows = {}
+        for recipe_id, ingredient_id in IngredientRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            rows.setdefault(recipe_id, set()).add(ingredient_id)
+        existing = set(Recipe.objects.filter(
+            pk__in=recipe_ids
+        ).values_list('pk', flat=True))
+        for recipe_id in recipe_ids:
+            self._set_recipe(
+                state, recipe_id,
+                rows.get(recipe_id, set()) if recipe_id in existing else None
+            )
+
+    @staticmethod
+    def _recipe_ingredients(state, position):
+        if position in state['overrides']:
+            return state['overrides'][position]
+        offsets = state['offsets']
+        if position + 1 >= len(offsets):
+            return ()
+        return state['items'][offsets[position]:offsets[position + 1]]
+
+    def _set_recipe(self, state, recipe_id, ingredient_ids):
+        position = state['positions'].get(recipe_id)
+        if position is None:
+            if ingredient_ids is None:
+                return
+            position = len(state['recipe_ids'])
+            state['recipe_ids'].append(recipe_id)
+            state['totals'].append(0)
+            state['positions'][recipe_id] = position
+        bit = 1 << position
+        bitmaps = state['bitmaps']
+        for ingredient_id in self._recipe_ingredients(state, position):
+            bitmaps[ingredient_id] &= ~bit
+        state['overrides'][position] = tuple(ingredient_ids or ())
+        state['planes'] = [plane & ~bit for plane in state['planes']]
+        if ingredient_ids is None:
+            state['alive'] &= ~bit
+            state['totals'][position] = 0
+            return
+        state['alive'] |= bit
+        for ingredient_id in ingredient_ids:
+            bitmaps[ingredient_id] = bitmaps.get(ingredient_id, 0) | bit
+        total = len(ingredient_ids)
+        state['totals'][position] = total
+        planes = state['planes']
+        while len(planes) < total.bit_length():
+            planes.append(0)
+        for index in range(total.bit_length()):
+            if total >> index & 1:
+                planes[index] |= bit
+
+    def refresh(self, *recipe_ids):
+        """
+        Отмечает рецепты изменёнными. После фиксации транзакции их
+        ингредиенты перечитываются одним запросом, а изменения одной
+        записью журнала публикуются для других процессов — сколько бы
+        строк рецепта ни изменилось.
+        """
+        pending = getattr(self._pending, 'recipe_ids', None)
+        if pending is None:
+            pending = self._pending.recipe_ids = set()
+        pending.update(recipe_ids)
+        # Каждый вызов ставит обработчик, но работу делает только первый
+        # после фиксации; при откате набор дождётся следующей фиксации.
+        transaction.on_commit(self._publish)
+
+    def _publish(self):
+        recipe_ids = getattr(self._pending, 'recipe_ids', None)
+        if not recipe_ids:
+            return
+        self._pending.recipe_ids = set()
+        try:
+            version = cache.incr(MATCH_VERSION_KEY)
+        except ValueError:
+            cache.add(MATCH_VERSION_KEY, 0, None)
+            version = cache.incr(MATCH_VERSION_KEY)
+        cache.set(
+            MATCH_CHANGE_KEY.format(version=version), tuple(recipe_ids),
+            MATCH_INDEX_TIMEOUT
+        )
+        state = self._state
+        if state is not None:
+            self._sync(state)
+
+    def reset(self):
+        self._state = None
+
+    def match(self, ingredient_ids, max_missing=0, limit=None):
+        """
+        Рецепты, в которых есть хотя бы один из ингредиентов и не хватает
+        не более max_missing. Возвращает кортежи (id рецепта, найдено,
+        всего) по убыванию доли найденных ингредиентов, затем числа
+        найденных, затем от новых рецептов к старым.
+
+        Рецепты группируются по паре (не хватает, всего): доля у всей
+        группы одна, поэтому группы сортируются заранее, а позиции
+        извлекаются только из лучших групп, пока не наберётся limit.
+        """
+        state = self._get_state()
+        # _set_recipe меняет состояние под блокировкой, в том числе список
+        # planes на месте. Битовые карты — неизменяемые int, поэтому под
+        # блокировкой достаточно взять ссылки на них и копию planes.
+        # recipe_ids только дописывается: позиции из снимка не меняются.
+        with self._lock:
+            ingredient_bits = [
+                state['bitmaps'].get(ingredient_id)
+                for ingredient_id in set(ingredient_ids)
+            ]
+            alive = state['alive']
+            planes = list(state['planes'])
+            recipe_ids = state['recipe_ids']
+        matched = []
+        candidates = 0
+        for bits in ingredient_bits:
+            if bits:
+                add_to_planes(matched, bits)
+                candidates |= bits
+        candidates &= alive
+        if not candidates:
+            return []
+        missing = subtract_planes(planes, matched)
+        by_missing = {
+            count: equals_mask(missing, count, candidates)
+            for count in range(max_missing + 1)
+        }
+        by_total = {
+            total: equals_mask(planes, total, candidates)
+            for total in range(1, 1 << len(planes))
+        }
+        groups = sorted(
+            (
+                (count, total)
+                for count, missing_bits in by_missing.items() if missing_bits
+                for total, total_bits in by_total.items()
+                if total > count and total_bits
+            ),
+            key=lambda group: (
+                -(group[1] - group[0]) / group[1], -(group[1] - group[0])
+            )
+        )
+        found = []
+        for count, total in groups:
+            bits = by_missing[count] & by_total[total]
+            while bits and (limit is None or len(found) < limit):
+                position = bits.bit_length() - 1
+                bits ^= 1 << position
+                found.append((recipe_ids[position], total - count, total))
+            if limit is not None and len(found) >= limit:
+                break
+        return found
+
+
+ingredient_matcher = IngredientMatcher()
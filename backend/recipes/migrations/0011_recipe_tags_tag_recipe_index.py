@@ -0,0 +1,18 @@
+from django.db import migrations
+
+INDEX_NAME = 'recipes_recipe_tags_tag_recipe_idx'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} '
+            'ON recipes_recipe_tags (tag_id, recipe_id)',
+            f'DROP INDEX IF EXISTS {INDEX_NAME}',
+        ),
+    ]
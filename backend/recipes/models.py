@@ -1,6 +1,12 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Exists, OuterRef, Subquery, Value
+from django.utils import timezone
+
+from backend.constants import SHOPPING_LIST_DEFAULT_FORMAT
+from users.models import Subscribe
 
 User = get_user_model()
 
@@ -40,9 +46,78 @@ class Ingredient(models.Model):
         return f'{self.name}, {self.measurement_unit}'
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related(self):
+        return self.select_related('author').prefetch_related(
+            'tags', 'ingredient__ingredient'
+        )
+
+    def with_user_relations(self, user):
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                is_subscribed=Value(False),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_subscribed=Exists(Subscribe.objects.filter(
+                user=user, author=OuterRef('author')
+            )),
+        )
+
+    def touch(self):
+        """Отмечает рецепты изменёнными без вызова save() и сигналов."""
+        return self.update(updated_at=timezone.now())
+
+    def latest_per_author(self, limit=None):
+        """
+        Оставляет не более limit последних рецептов каждого автора.
+        Подходит как queryset для Prefetch: все авторы страницы получают
+        свои рецепты одним запросом с коррелированным подзапросом.
+        """
+        queryset = self.only(
+            'id', 'name', 'image', 'image_card', 'cooking_time', 'author'
+        )
+        if limit is None:
+            return queryset
+        return queryset.filter(pk__in=Subquery(
+            Recipe.objects.filter(author=OuterRef('author'))
+            .order_by('-pub_date', '-id')
+            .values('pk')[:limit]
+        ))
+
+
 class Recipe(models.Model):
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUSES = (
+        (IMAGE_PENDING, 'Обрабатывается'),
+        (IMAGE_READY, 'Готово'),
+        (IMAGE_FAILED, 'Ошибка обработки'),
+    )
+
     name = models.CharField('Название рецепта', max_length=200)
     image = models.ImageField('Изображение', upload_to='recipes/images/')
+    image_card = models.ImageField(
+        'Изображение для карточки', upload_to='recipes/images/',
+        blank=True, editable=False
+    )
+    image_detail = models.ImageField(
+        'Изображение для страницы рецепта', upload_to='recipes/images/',
+        blank=True, editable=False
+    )
+    image_status = models.CharField(
+        'Статус изображения', max_length=20, choices=IMAGE_STATUSES,
+        default=IMAGE_READY, editable=False
+    )
     text = models.TextField('Описание')
     author = models.ForeignKey(
         User,
@@ -74,11 +149,33 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
+    favorites_count = models.PositiveIntegerField(
+        'Кол-во добавлений в избранное', default=0, editable=False
+    )
+    carts_count = models.PositiveIntegerField(
+        'Кол-во добавлений в список покупок', default=0, editable=False
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'), name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.name} ({self.author})'
@@ -166,3 +263,48 @@ class ShoppingCart(models.Model):
                 name='uniq_cart_user_recipe'
             )
         ]
+
+
+class ShoppingListExport(models.Model):
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (PROCESSING, 'Формируется'),
+        (DONE, 'Готов'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_exports',
+        verbose_name='Пользователь',
+    )
+    file_format = models.CharField(
+        'Формат', max_length=10, default=SHOPPING_LIST_DEFAULT_FORMAT
+    )
+    status = models.CharField(
+        'Статус', max_length=20, choices=STATUSES, default=PENDING
+    )
+    file = models.FileField(
+        'Файл', upload_to='shopping_lists/', blank=True
+    )
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создан', auto_now_add=True)
+    finished = models.DateTimeField('Завершён', null=True, blank=True)
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'Выгрузка списка покупок'
+        verbose_name_plural = 'Выгрузки списков покупок'
+        indexes = (
+            models.Index(
+                fields=('status', 'created'), name='export_status_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user} ({self.file_format}, {self.status})'
@@ -0,0 +1,12 @@
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class ShoppingListContentNegotiation(DefaultContentNegotiation):
+    """
+    Параметр ?format= выбирает формат файла списка покупок, а не рендерер
+    DRF. Ошибки отдаются первым рендерером из настроек (JSON).
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderer = renderers[0]
+        return renderer, renderer.media_type
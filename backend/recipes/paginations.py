@@ -1,5 +1,146 @@
+import json
+
+from django.db.models import Q
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
 
 
 class CustomPageNumberPagination(pagination.PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+def keyset_filter(ordering, position):
+    """
+    Строки строго после position в порядке ordering:
+    (a, b) < (x, y) раскрывается в a <= x AND (a < x OR (a = x AND b < y)).
+    Нестрогое условие на первое поле позволяет базе начать с диапазона
+    индекса, а не просматривать его с начала.
+    """
+    condition = None
+    for field, value in reversed(list(zip(ordering, position))):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        after = Q(**{f'{name}__{lookup}': value})
+        condition = after if condition is None else (
+            after | Q(**{name: value}) & condition
+        )
+    first = ordering[0]
+    lookup = 'lte' if first.startswith('-') else 'gte'
+    return Q(**{f'{first.lstrip("-")}__{lookup}': position[0]}) & condition
+
+
+class KeysetCursorPagination(pagination.CursorPagination):
+    """
+    CursorPagination DRF хранит в курсоре только первое поле ordering и
+    пропускает строки с тем же значением через OFFSET. Здесь курсор
+    хранит значения всех полей ordering, а страница фильтруется по их
+    кортежу, так что OFFSET не нужен. Последнее поле ordering должно
+    быть уникальным.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+        ordering = (
+            pagination._reverse_ordering(self.ordering) if reverse
+            else self.ordering
+        )
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            try:
+                position = json.loads(current_position)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+            if (not isinstance(position, list)
+                    or len(position) != len(ordering)):
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(keyset_filter(ordering, position))
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            has_following_position = False
+            following_position = None
+        # Дальше — как в CursorPagination.paginate_queryset.
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None or offset > 0
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for field in ordering:
+            name = field.lstrip('-')
+            if isinstance(instance, dict):
+                values.append(str(instance[name]))
+            else:
+                values.append(str(getattr(instance, name)))
+        return json.dumps(values)
+
+
+class RecipeCursorPagination(KeysetCursorPagination):
+    ordering = ('-pub_date', '-id')
+    page_size_query_param = 'limit'
+
+
+class SubscriptionCursorPagination(KeysetCursorPagination):
+    ordering = ('username', 'id')
+    page_size_query_param = 'limit'
+
+
+class OptionalCursorPagination(CustomPageNumberPagination):
+    """
+    Постраничная пагинация с переходом на курсорную, если в запросе есть
+    параметр cursor (пустой — первая страница). Курсорный ответ не
+    содержит count и не выполняет COUNT(*) и OFFSET.
+    """
+    cursor_pagination_class = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_query_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_query_param in request.query_params:
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        self.cursor_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePagination(OptionalCursorPagination):
+    cursor_pagination_class = RecipeCursorPagination
+
+
+class SubscriptionPagination(OptionalCursorPagination):
+    cursor_pagination_class = SubscriptionCursorPagination
@@ -0,0 +1,202 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector
+)
+from django.db import connection
+from django.db.models import (
+    Case, F, IntegerField, OuterRef, Subquery, Value, When
+)
+from django.db.models.functions import Coalesce
+
+from backend.constants import RECIPE_SEARCH_CONFIG, RECIPE_SEARCH_WEIGHTS
+from .models import Ingredient, IngredientRecipe, Recipe
+
+
+class IngredientPrefixIndex:
+    """
+    Отсортированный в памяти процесса список названий ингредиентов.
+    Используется вместо индексов PostgreSQL (например, на SQLite, где
+    UPPER() не работает с кириллицей).
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._entries = None
+
+    def _get_entries(self):
+        entries = self._entries
+        if entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self._entries = sorted(
+                        (name.casefold(), pk) for pk, name in
+                        Ingredient.objects.values_list('id', 'name')
+                    )
+                entries = self._entries
+        return entries
+
+    def reset(self):
+        self._entries = None
+
+    def search(self, query, limit=None):
+        entries = self._get_entries()
+        query = query.casefold()
+        found = []
+        position = bisect_left(entries, (query,))
+        while position < len(entries) and len(found) != limit:
+            name, pk = entries[position]
+            if not name.startswith(query):
+                break
+            found.append(pk)
+            position += 1
+        for name, pk in entries:
+            if len(found) == limit:
+                break
+            if query in name and not name.startswith(query):
+                found.append(pk)
+        return found
+
+
+ingredient_index = IngredientPrefixIndex()
+
+
+def search_ingredients(queryset, query, limit=None):
+    """
+    Ингредиенты, название которых начинается с query, затем содержащие
+    query в середине названия.
+    """
+    if connection.vendor == 'postgresql':
+        queryset = queryset.filter(name__icontains=query).annotate(
+            prefix_rank=Case(
+                When(name__istartswith=query, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by('prefix_rank', 'name')
+        return queryset[:limit] if limit else queryset
+    ids = ingredient_index.search(query, limit)
+    return queryset.filter(pk__in=ids).order_by(Case(
+        *(When(pk=pk, then=Value(position))
+          for position, pk in enumerate(ids)),
+        output_field=IntegerField(),
+    ))
+
+
+def tokenize(text):
+    return re.findall(r'\w+', text.casefold())
+
+
+class RecipeInvertedIndex:
+    """
+    Обратный индекс слово -> {id рецепта: вес} в памяти процесса.
+    Заменяет полнотекстовый поиск PostgreSQL на SQLite: слова из названия
+    весят больше слов из ингредиентов, а те — больше слов из описания.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._postings = None
+
+    def _build(self):
+        postings = defaultdict(lambda: defaultdict(float))
+        weights = RECIPE_SEARCH_WEIGHTS
+        for pk, name, text in Recipe.objects.values_list('id', 'name', 'text'):
+            for token in tokenize(name):
+                postings[token][pk] += weights['name']
+            for token in tokenize(text):
+                postings[token][pk] += weights['text']
+        for pk, name in IngredientRecipe.objects.values_list(
+            'recipe_id', 'ingredient__name'
+        ):
+            for token in tokenize(name):
+                postings[token][pk] += weights['ingredients']
+        return {token: dict(recipes) for token, recipes in postings.items()}
+
+    def _get_postings(self):
+        postings = self._postings
+        if postings is None:
+            with self._lock:
+                if self._postings is None:
+                    self._postings = self._build()
+                postings = self._postings
+        return postings
+
+    def reset(self):
+        self._postings = None
+
+    def search(self, query):
+        """id рецептов, содержащих все слова запроса, по убыванию веса."""
+        postings = self._get_postings()
+        scores = None
+        for token in set(tokenize(query)):
+            matches = postings.get(token, {})
+            if scores is None:
+                scores = dict(matches)
+            else:
+                scores = {
+                    pk: score + matches[pk]
+                    for pk, score in scores.items() if pk in matches
+                }
+            if not scores:
+                return []
+        return sorted(scores, key=lambda pk: (-scores[pk], -pk))
+
+
+recipe_index = RecipeInvertedIndex()
+
+
+def recipe_search_vector():
+    """Название — вес A, ингредиенты — B, описание — C."""
+    ingredient_names = Subquery(
+        IngredientRecipe.objects.filter(recipe=OuterRef('pk'))
+        .order_by()
+        .values('recipe')
+        .annotate(names=StringAgg('ingredient__name', ' '))
+        .values('names')
+    )
+    return (
+        SearchVector('name', weight='A', config=RECIPE_SEARCH_CONFIG)
+        + SearchVector(
+            Coalesce(ingredient_names, Value('')),
+            weight='B', config=RECIPE_SEARCH_CONFIG
+        )
+        + SearchVector('text', weight='C', config=RECIPE_SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(*recipe_ids):
+    """
+    Пересчитывает сохранённый tsvector рецептов одним UPDATE (все рецепты,
+    если id не переданы). На SQLite сбрасывает индекс в памяти.
+    """
+    if connection.vendor != 'postgresql':
+        recipe_index.reset()
+        return
+    queryset = Recipe.objects.all()
+    if recipe_ids:
+        queryset = queryset.filter(pk__in=recipe_ids)
+    queryset.update(search_vector=recipe_search_vector())
+
+
+def search_recipes(queryset, query):
+    """Рецепты, подходящие под запрос, от наиболее релевантных."""
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(
+            query, config=RECIPE_SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', '-pub_date', '-id')
+    ids = recipe_index.search(query)
+    if not ids:
+        return queryset.none()
+    return queryset.filter(pk__in=ids).order_by(Case(
+        *(When(pk=pk, then=Value(position))
+          for position, pk in enumerate(ids)),
+        output_field=IntegerField(),
+    ))
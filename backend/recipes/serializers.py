@@ -2,15 +2,36 @@ from django.db import transaction
 
 from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator
 
-from backend.constants import MINIMUM_AMOUNT
+from backend.constants import (
+    CART_BATCH_LIMIT, MINIMUM_AMOUNT, SHOPPING_LIST_FORMATS
+)
+from backend.services.shoplist import invalidate_shopping_list
 from users.models import Subscribe
+from .counters import delete_rows
+from .fields import BulkPrimaryKeyRelatedField, resolve_pks
+from .images import schedule_recipe_image
+from .matching import ingredient_matcher
+from .search import update_search_vectors
 from .models import (
-    Favorite, Ingredient, Recipe, ShoppingCart, Tag, IngredientRecipe, User
+    Favorite, Ingredient, Recipe, ShoppingCart, Tag, IngredientRecipe, User,
+    ShoppingListExport
 )
 
 
+def ingredients_changed(recipe_id):
+    """
+    Пакетные запросы к IngredientRecipe не отправляют построчных
+    сигналов, поэтому зависящие от состава данные обновляются здесь один
+    раз на рецепт. updated_at и версию ответов уже обновил save() рецепта.
+    """
+    invalidate_shopping_list(*ShoppingCart.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('user_id', flat=True))
+    update_search_vectors(recipe_id)
+    ingredient_matcher.refresh(recipe_id)
+
+
 class IngredientSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -41,12 +62,6 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = IngredientRecipe
         fields = ('id', 'name', 'measurement_unit', 'amount')
-        validators = [
-            UniqueTogetherValidator(
-                queryset=IngredientRecipe.objects.all(),
-                fields=('ingredient', 'recipe')
-            )
-        ]
 
 
 class UserRepresentationSerializer(serializers.ModelSerializer):
@@ -59,6 +74,8 @@ class UserRepresentationSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
@@ -74,21 +91,34 @@ class RecipeListSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
-    def _check_user_relation(self, obj, model):
+    def to_representation(self, instance):
+        if hasattr(instance, 'is_subscribed') and instance.author:
+            instance.author.is_subscribed = instance.is_subscribed
+        return super().to_representation(instance)
+
+    def _check_user_relation(self, obj, model, annotation):
+        if hasattr(obj, annotation):
+            return getattr(obj, annotation)
         user = self.context.get('request').user
         return not user.is_anonymous and model.objects.filter(
             user=user, recipe=obj
         ).exists()
 
     def get_is_favorited(self, obj):
-        return self._check_user_relation(obj, Favorite)
+        return self._check_user_relation(obj, Favorite, 'is_favorited')
 
     def get_is_in_shopping_cart(self, obj):
-        return self._check_user_relation(obj, ShoppingCart)
+        return self._check_user_relation(
+            obj, ShoppingCart, 'is_in_shopping_cart'
+        )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
-        return Subscribe.objects.filter(user=user, author=obj.author).exists()
+        return not user.is_anonymous and Subscribe.objects.filter(
+            user=user, author=obj.author
+        ).exists()
 
     class Meta:
         model = Recipe
@@ -102,23 +132,52 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'is_subscribed',
             'name',
             'image',
+            'image_card',
+            'image_detail',
+            'image_status',
             'text',
             'cooking_time'
         )
 
 
+class RecipeMatchSerializer(RecipeListSerializer):
+    matched_ingredients = serializers.IntegerField(read_only=True)
+    total_ingredients = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + (
+            'matched_ingredients', 'total_ingredients',
+        )
+
+
+class IngredientCreateListSerializer(serializers.ListSerializer):
+    """Проверяет id всех ингредиентов рецепта одним запросом."""
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = resolve_pks(
+            Ingredient.objects.all(),
+            [item['id'] for item in items],
+            'Ингредиенты с id {pks} не найдены.'
+        )
+        for item, ingredient in zip(items, ingredients):
+            item['id'] = ingredient
+        return items
+
+
 class IngredientCreateSerializer(serializers.ModelSerializer):
 
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
 
     class Meta:
         model = IngredientRecipe
         fields = ('id', 'amount')
+        list_serializer_class = IngredientCreateListSerializer
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     author = UserRepresentationSerializer(read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
@@ -126,33 +185,78 @@ class RecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
 
     def to_representation(self, instance):
+        """
+        Ответ на запись: рецепт перечитывается с теми же prefetch и
+        аннотациями, что и в списке, поэтому число запросов не зависит от
+        числа ингредиентов.
+        """
         request = self.context.get('request')
+        instance = Recipe.objects.with_related().with_user_relations(
+            request.user
+        ).get(pk=instance.pk)
         serializer = RecipeListSerializer(
             instance,
             context={'request': request}
         )
         return serializer.data
 
-    def _create_or_update_ingredients(self, instance, ingredients_data):
-        instance.ingredients.clear()
-        ingredients_list = [
+    def _create_ingredients(self, instance, ingredients_data):
+        IngredientRecipe.objects.bulk_create(
             IngredientRecipe(
                 recipe=instance,
-                ingredient=ingredient_data.get('id'),
-                amount=ingredient_data.get('amount')
+                ingredient=ingredient_data['id'],
+                amount=ingredient_data['amount']
             )
             for ingredient_data in ingredients_data
+        )
+
+    def _update_ingredients(self, instance, ingredients_data):
+        """
+        Сверяет присланные ингредиенты с сохранёнными и выполняет только
+        нужные удаления, обновления количества и вставки — каждое одним
+        запросом. Возвращает True, если состав рецепта изменился.
+        """
+        amounts = {
+            ingredient_data['id'].pk: ingredient_data['amount']
+            for ingredient_data in ingredients_data
+        }
+        existing = {
+            row.ingredient_id: row
+            for row in IngredientRecipe.objects.filter(recipe=instance)
+        }
+        removed = existing.keys() - amounts.keys()
+        if removed:
+            delete_rows(IngredientRecipe.objects.filter(
+                recipe=instance, ingredient_id__in=removed
+            ))
+        changed = []
+        for ingredient_id, row in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ('amount',))
+        added = [
+            ingredient_data for ingredient_data in ingredients_data
+            if ingredient_data['id'].pk not in existing
         ]
-        IngredientRecipe.objects.bulk_create(ingredients_list)
+        self._create_ingredients(instance, added)
+        return bool(removed or changed or added)
 
     @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
 
-        recipe = Recipe.objects.create(**validated_data)
+        recipe = Recipe.objects.create(
+            **validated_data, image_status=Recipe.IMAGE_PENDING
+        )
+        schedule_recipe_image(recipe)
         recipe.tags.set(tags_data)
-        self._create_or_update_ingredients(recipe, ingredients_data)
+        self._create_ingredients(recipe, ingredients_data)
+        update_search_vectors(recipe.pk)
+        ingredient_matcher.refresh(recipe.pk)
 
         return recipe
 
@@ -161,9 +265,16 @@ class RecipeSerializer(serializers.ModelSerializer):
         ingredients_data = validated_data.pop('ingredients', None)
         tags_data = validated_data.pop('tags', None)
 
+        if 'image' in validated_data:
+            validated_data['image_status'] = Recipe.IMAGE_PENDING
         instance = super().update(instance, validated_data)
-        instance.tags.set(tags_data)
-        self._create_or_update_ingredients(instance, ingredients_data)
+        if 'image' in validated_data:
+            schedule_recipe_image(instance)
+        if tags_data is not None:
+            instance.tags.set(tags_data)
+        if (ingredients_data is not None
+                and self._update_ingredients(instance, ingredients_data)):
+            ingredients_changed(instance.pk)
 
         return instance
 
@@ -210,4 +321,31 @@ class BriefRecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_card', 'cooking_time')
+
+
+class ShoppingListExportSerializer(serializers.ModelSerializer):
+    format = serializers.ChoiceField(
+        source='file_format', choices=SHOPPING_LIST_FORMATS, required=False
+    )
+
+    class Meta:
+        model = ShoppingListExport
+        fields = ('id', 'format', 'status', 'file', 'error',
+                  'created', 'finished')
+        read_only_fields = ('status', 'file', 'error', 'created', 'finished')
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = BulkPrimaryKeyRelatedField(
+        many=True, queryset=Recipe.objects.all()
+    )
+
+    def validate_recipes(self, value):
+        recipes = list({recipe.pk: recipe for recipe in value}.values())
+        if len(recipes) > CART_BATCH_LIMIT:
+            raise serializers.ValidationError(
+                f'За один запрос можно передать не больше '
+                f'{CART_BATCH_LIMIT} рецептов.'
+            )
+        return recipes
@@ -0,0 +1,159 @@
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete
+)
+from django.dispatch import receiver
+
+from backend.services.shoplist import invalidate_shopping_list
+from users.models import User
+from .caching import bump_recipes_version
+from .catalog import ingredient_catalog, tag_catalog
+from .counters import change_counter
+from .feed import invalidate_feeds, invalidate_follower_feeds
+from .matching import ingredient_matcher
+from .models import (
+    Favorite, Ingredient, IngredientRecipe, Recipe, ShoppingCart, Tag
+)
+from .search import ingredient_index, update_search_vectors
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def invalidate_cart_shopping_list(sender, instance, **kwargs):
+    invalidate_shopping_list(instance.user_id)
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+def invalidate_recipe_shopping_lists(sender, instance, **kwargs):
+    invalidate_shopping_list(*ShoppingCart.objects.filter(
+        recipe_id=instance.recipe_id
+    ).values_list('user_id', flat=True))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def reset_ingredient_catalog(sender, **kwargs):
+    ingredient_index.reset()
+    ingredient_catalog.reset()
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes_search(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vectors(*IngredientRecipe.objects.filter(
+            ingredient=instance
+        ).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'name', 'text'} & set(update_fields):
+        update_search_vectors(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+def update_ingredient_row_search(sender, instance, **kwargs):
+    update_search_vectors(instance.recipe_id)
+    ingredient_matcher.refresh(instance.recipe_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_matcher(sender, instance, **kwargs):
+    ingredient_matcher.refresh(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def reset_tag_catalog(sender, **kwargs):
+    tag_catalog.reset()
+
+
+def change_recipe_counter(instance, signal, field):
+    change_counter(
+        Recipe, instance.recipe_id, field, 1 if signal is post_save else -1
+    )
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def count_favorites(sender, instance, signal, created=True, **kwargs):
+    if created:
+        change_recipe_counter(instance, signal, 'favorites_count')
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def count_carts(sender, instance, signal, created=True, **kwargs):
+    if created:
+        change_recipe_counter(instance, signal, 'carts_count')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def count_recipes(sender, instance, signal, created=True, **kwargs):
+    if created and instance.author_id:
+        change_counter(
+            User, instance.author_id, 'recipes_count',
+            1 if signal is post_save else -1
+        )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe_feeds(sender, instance, **kwargs):
+    if instance.author_id:
+        invalidate_follower_feeds(instance.author_id)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def invalidate_user_feed(sender, instance, **kwargs):
+    invalidate_feeds(instance.user_id)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_recipe_responses(sender, **kwargs):
+    bump_recipes_version()
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_responses(sender, instance, created, update_fields=None,
+                                **kwargs):
+    """
+    Рецепты и ленты встраивают автора, поэтому смена его профиля отмечает
+    его рецепты изменёнными для ETag и сбрасывает закэшированные ответы.
+    Вход обновляет только last_login и пропускается.
+    """
+    if created or update_fields and set(update_fields) == {'last_login'}:
+        return
+    Recipe.objects.filter(author=instance).touch()
+    bump_recipes_version()
+    invalidate_follower_feeds(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+def touch_ingredient_row_recipe(sender, instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).touch()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_tagged_recipe(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        Recipe.objects.filter(tags=instance).touch()
+    elif action in ('post_add', 'post_remove'):
+        Recipe.objects.filter(
+            pk__in=pk_set if reverse else (instance.pk,)
+        ).touch()
+    elif action == 'post_clear' and not reverse:
+        Recipe.objects.filter(pk=instance.pk).touch()
+    else:
+        return
+    bump_recipes_version()
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(post_save, sender=Tag)
+def touch_tag_recipes(sender, instance, created=False, **kwargs):
+    if not created:
+        Recipe.objects.filter(tags=instance).touch()
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(ingredient__ingredient=instance).touch()
@@ -0,0 +1,1050 @@
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import skipIf
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count
+from django.http import QueryDict
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient, APITestCase
+
+from backend.constants import INGREDIENTS_SEARCH_LIMIT, MATCH_VERSION_KEY
+from backend.services.metrics import (
+    METRICS, load_reports, remove_stale_reports
+)
+from users.models import Subscribe
+from .catalog import ingredient_catalog, tag_catalog
+from .exports import claim_exports, fail_export, process_export
+from .filters import RecipeFilter
+from .management.commands.import_ingredients import iter_json_array
+from .management.commands.run_export_workers import (
+    Command as ExportWorkersCommand
+)
+from .matching import add_to_planes, ingredient_matcher
+from .search import recipe_index, update_search_vectors
+from .models import (
+    Favorite, Ingredient, IngredientRecipe, Recipe, ShoppingCart,
+    ShoppingListExport, Tag, User
+)
+
+
+class RecipeFixturesMixin:
+    """Авторы, теги, ингредиенты и рецепты для тестов API рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@foodgram.ru', password='pass',
+            first_name='Reader', last_name='Reader'
+        )
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@foodgram.ru', password='pass',
+                first_name='Author', last_name=str(number)
+            )
+            for number in range(3)
+        ]
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', slug=f'tag{number}',
+                color=f'#00000{number}'
+            )
+            for number in range(3)
+        ]
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(60)
+        )
+        cls.ingredients = list(Ingredient.objects.order_by('pk'))
+        cls.recipes = [
+            cls.create_recipe(number) for number in range(12)
+        ]
+        Subscribe.objects.create(user=cls.user, author=cls.authors[0])
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[1])
+
+    @classmethod
+    def create_recipe(cls, number):
+        recipe = Recipe.objects.create(
+            name=f'Рецепт {number}', text='Описание',
+            image='recipes/images/recipe.png', cooking_time=10,
+            author=cls.authors[number % len(cls.authors)]
+        )
+        recipe.tags.set(cls.tags[:number % len(cls.tags) + 1])
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=recipe, ingredient=ingredient, amount=10)
+            for ingredient in cls.ingredients[number:number + 3]
+        )
+        return recipe
+
+    def setUp(self):
+        cache.clear()
+
+
+class RecipeQueryCountTest(RecipeFixturesMixin, APITestCase):
+    """
+    Число запросов списка и страницы рецепта не зависит от числа
+    рецептов на странице.
+    """
+
+    def assertListQueries(self, num, params=None):
+        for limit in (2, 10):
+            cache.clear()
+            with self.assertNumQueries(num):
+                response = self.client.get(
+                    '/api/recipes/', {**(params or {}), 'limit': limit}
+                )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), limit)
+
+    def test_list_anonymous(self):
+        # Валидаторы ETag, COUNT, рецепты, теги, строки ингредиентов и
+        # ингредиенты — при любом размере страницы.
+        self.assertListQueries(6)
+
+    def test_list_authenticated(self):
+        self.client.force_authenticate(self.user)
+        self.assertListQueries(6)
+
+    def test_retrieve(self):
+        self.client.force_authenticate(self.user)
+        for recipe in self.recipes[:3]:
+            with self.assertNumQueries(5):
+                response = self.client.get(f'/api/recipes/{recipe.pk}/')
+            self.assertEqual(response.status_code, 200)
+
+    def test_user_flags(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/recipes/', {'limit': 12})
+        flags = {
+            recipe['id']: (
+                recipe['is_favorited'], recipe['is_in_shopping_cart'],
+                recipe['author']['is_subscribed']
+            )
+            for recipe in response.data['results']
+        }
+        self.assertEqual(flags[self.recipes[0].pk], (True, False, True))
+        self.assertEqual(flags[self.recipes[1].pk], (False, True, False))
+
+
+class RecipeConditionalGetTest(RecipeFixturesMixin, APITestCase):
+    """Валидаторы ответа считаются по updated_at рецептов."""
+
+    def test_anonymous_cache_hit_checks_validators(self):
+        response = self.client.get('/api/recipes/')
+        # Только агрегат валидаторов: ответ берётся из кэша.
+        with self.assertNumQueries(1):
+            cached = self.client.get('/api/recipes/')
+        self.assertEqual(cached.data, response.data)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                '/api/recipes/', HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_cursor_page_without_aggregate(self):
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/recipes/', {'cursor': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertFalse([
+            query['sql'] for query in queries
+            if 'MAX(' in query['sql'] or 'COUNT(' in query['sql']
+        ])
+
+    def test_write_without_signals_updates_etag(self):
+        # Так выглядит запись из другого процесса: сигналы и версии в
+        # локальном кэше этого процесса её не видят.
+        detail = f'/api/recipes/{self.recipes[0].pk}/'
+        etags = [self.client.get(path)['ETag']
+                 for path in ('/api/recipes/', detail)]
+        Recipe.objects.filter(pk=self.recipes[0].pk).update(
+            name='Другой рецепт', updated_at=timezone.now()
+        )
+        for path, etag in zip(('/api/recipes/', detail), etags):
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+        # Закэшированный анонимный ответ тоже не отдаётся.
+        self.assertEqual(response.data['name'], 'Другой рецепт')
+
+    def test_if_none_match_any(self):
+        for user in (None, self.user):
+            self.client.force_authenticate(user)
+            missing = self.client.get(
+                '/api/recipes/999999/', HTTP_IF_NONE_MATCH='*'
+            )
+            self.assertEqual(missing.status_code, 404)
+            self.assertNotIn('ETag', missing)
+            existing = self.client.get(
+                f'/api/recipes/{self.recipes[0].pk}/', HTTP_IF_NONE_MATCH='*'
+            )
+            self.assertEqual(existing.status_code, 304)
+
+    def test_recipe_change_updates_etag(self):
+        etag = self.client.get('/api/recipes/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.filter(pk=self.recipes[0].pk).get().save()
+        response = self.client.get(
+            '/api/recipes/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_author_change_updates_etag(self):
+        response = self.client.get('/api/recipes/')
+        author = User.objects.get(pk=self.authors[0].pk)
+        author.first_name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            author.save()
+        response = self.client.get(
+            '/api/recipes/', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Renamed', {
+            recipe['author']['first_name']
+            for recipe in response.data['results']
+        })
+
+    def test_login_keeps_etag(self):
+        etag = self.client.get('/api/recipes/')['ETag']
+        author = User.objects.get(pk=self.authors[0].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            author.save(update_fields=['last_login'])
+        self.assertEqual(self.client.get('/api/recipes/')['ETag'], etag)
+
+
+class RecipeTagFilterTest(RecipeFixturesMixin, APITestCase):
+    """Фильтр по трём тегам: без дублей, JOIN и DISTINCT, по индексу."""
+    tags_query = 'tags=tag0&tags=tag1&tags=tag2'
+
+    def test_three_tags_distinct(self):
+        response = self.client.get(
+            f'/api/recipes/?{self.tags_query}&limit=20'
+        )
+        ids = [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(response.data['count'], len(self.recipes))
+
+    def test_three_tags_query_plan(self):
+        queryset = RecipeFilter(
+            QueryDict(self.tags_query), queryset=Recipe.objects.all()
+        ).qs
+        sql = str(queryset.query)
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('DISTINCT', sql)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # На нескольких строках планировщик выбрал бы Seq Scan.
+                cursor.execute('SET LOCAL enable_seqscan TO off')
+            indexes = connection.introspection.get_constraints(
+                cursor, Recipe.tags.through._meta.db_table
+            )
+        plan = queryset.explain()
+        self.assertTrue(any(name in plan for name in indexes), plan)
+
+
+class RecipeCursorPaginationTest(RecipeFixturesMixin, APITestCase):
+    """Курсор по (pub_date, id): одинаковые даты не требуют OFFSET."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        Recipe.objects.update(pub_date=timezone.now())
+
+    def get_page(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for query in queries:
+            self.assertNotIn('OFFSET', query['sql'])
+        return response.data
+
+    def test_same_pub_date(self):
+        expected = sorted(
+            (recipe.pk for recipe in self.recipes), reverse=True
+        )
+        pages = []
+        url = '/api/recipes/?cursor=&limit=5'
+        while url:
+            page = self.get_page(url)
+            pages.append([recipe['id'] for recipe in page['results']])
+            url = page['next']
+        self.assertEqual(sum(pages, []), expected)
+        page = self.get_page(page['previous'])
+        self.assertEqual(
+            [recipe['id'] for recipe in page['results']], pages[-2]
+        )
+
+    def test_invalid_cursor(self):
+        cursor = base64.b64encode(b'p=2026-01-01').decode()
+        response = self.client.get('/api/recipes/', {'cursor': cursor})
+        self.assertEqual(response.status_code, 404)
+
+
+class ShoppingCartBatchTest(RecipeFixturesMixin, APITestCase):
+    """Пакетные операции со списком покупок на обеих СУБД."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def cart(self):
+        return set(ShoppingCart.objects.filter(
+            user=self.user
+        ).values_list('recipe_id', flat=True))
+
+    def test_add_and_remove_batch(self):
+        recipe_ids = [recipe.pk for recipe in self.recipes[:3]]
+        response = self.client.post(
+            '/api/recipes/shopping_cart/', {'recipes': recipe_ids},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        # Второй рецепт уже был в списке покупок.
+        self.assertEqual(response.data['changed'], 2)
+        self.assertEqual(self.cart(), set(recipe_ids))
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe_ids[0]).carts_count, 1
+        )
+        response = self.client.delete(
+            '/api/recipes/shopping_cart/', {'recipes': recipe_ids[:2]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['changed'], 2)
+        self.assertEqual(self.cart(), {recipe_ids[2]})
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe_ids[0]).carts_count, 0
+        )
+
+    def test_add_filtered_and_clear(self):
+        response = self.client.post(
+            '/api/recipes/shopping_cart/filtered/?tags=tag2'
+        )
+        self.assertEqual(response.status_code, 201)
+        tagged = set(Recipe.objects.filter(
+            tags=self.tags[2]
+        ).values_list('pk', flat=True))
+        self.assertEqual(self.cart(), tagged | {self.recipes[1].pk})
+        response = self.client.delete('/api/recipes/shopping_cart/all/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['changed'], len(tagged | {
+            self.recipes[1].pk
+        }))
+        self.assertEqual(self.cart(), set())
+        self.assertEqual(response.data['ingredients'], [])
+
+    def test_filtered_requires_filter(self):
+        for query in ('', '?tags=', '?limit=5'):
+            response = self.client.post(
+                f'/api/recipes/shopping_cart/filtered/{query}'
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.cart(), {self.recipes[1].pk})
+
+    @patch('recipes.views.CART_BATCH_LIMIT', 3)
+    def test_filtered_limit(self):
+        # Под tag0 подходят все 12 рецептов.
+        response = self.client.post(
+            '/api/recipes/shopping_cart/filtered/?tags=tag0'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.cart(), {self.recipes[1].pk})
+
+    @patch('recipes.serializers.CART_BATCH_LIMIT', 3)
+    def test_batch_limit(self):
+        response = self.client.post(
+            '/api/recipes/shopping_cart/',
+            {'recipes': [recipe.pk for recipe in self.recipes[:4]]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class RecipeWriteQueryCountTest(RecipeFixturesMixin, APITestCase):
+    """Запись рецепта стоит одинаково при любом числе ингредиентов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media.enable()
+        buffer = io.BytesIO()
+        Image.new('RGB', (4, 4)).save(buffer, 'PNG')
+        cls.image = (
+            'data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode()
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.author = self.authors[0]
+        self.client.force_authenticate(self.author)
+
+    def create(self, ingredients):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/recipes/', {
+                'name': 'Новый рецепт',
+                'text': 'Описание',
+                'image': self.image,
+                'cooking_time': 10,
+                'tags': [tag.pk for tag in self.tags],
+                'ingredients': [
+                    {'id': ingredient.pk, 'amount': 5}
+                    for ingredient in ingredients
+                ],
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(response.data['ingredients']), len(ingredients))
+        return [query['sql'] for query in queries]
+
+    def test_create_with_50_ingredients(self):
+        few = self.create(self.ingredients[:5])
+        many = self.create(self.ingredients[:50])
+        self.assertEqual(len(few), len(many))
+        # Проверка id одним IN и prefetch для ответа.
+        self.assertEqual(len([
+            sql for sql in many if 'FROM "recipes_ingredient"' in sql
+        ]), 2)
+
+    def patch_ingredients(self, recipe, ingredients):
+        return self.client.patch(f'/api/recipes/{recipe.pk}/', {
+            'tags': [self.tags[0].pk],
+            'cooking_time': 10,
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 5}
+                for ingredient in ingredients
+            ],
+        }, format='json')
+
+    def test_update_removing_ingredients(self):
+        writes = []
+        for removed in (1, 10):
+            recipe = self.create_recipe(0)
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(recipe=recipe, ingredient=ingredient,
+                                 amount=10)
+                for ingredient in self.ingredients[3:12]
+            )
+            with CaptureQueriesContext(connection) as queries:
+                response = self.patch_ingredients(
+                    recipe, self.ingredients[removed:12]
+                )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                len(response.data['ingredients']), 12 - removed
+            )
+            statements = [
+                query['sql'] for query in queries
+                if not query['sql'].startswith('SELECT')
+            ]
+            self.assertEqual(len([
+                sql for sql in statements if sql.startswith('DELETE')
+            ]), 1)
+            writes.append(len(statements))
+        # Удаление одним запросом, побочные действия — один раз.
+        self.assertEqual(writes[0], writes[1])
+
+    def test_update_without_ingredient_changes(self):
+        recipe = self.recipes[0]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.patch_ingredients(
+                recipe, self.ingredients[0:3]
+            )
+        self.assertEqual(response.status_code, 200)
+        # Количество меняется, но строки не удаляются и не добавляются.
+        self.assertFalse(any(
+            query['sql'].startswith('DELETE') for query in queries
+        ))
+
+
+class RecipeMatchTest(RecipeFixturesMixin, APITestCase):
+    """Подбор рецептов по имеющимся ингредиентам."""
+
+    def setUp(self):
+        super().setUp()
+        ingredient_matcher.reset()
+
+    def match(self, ingredients, max_missing):
+        response = self.client.get('/api/recipes/match/', {
+            'ingredients': ','.join(str(item.pk) for item in ingredients),
+            'max_missing': max_missing,
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_ranked_by_coverage(self):
+        results = self.match(self.ingredients[:4], 2)
+        coverage = [
+            recipe['matched_ingredients'] / recipe['total_ingredients']
+            for recipe in results
+        ]
+        self.assertEqual(coverage, sorted(coverage, reverse=True))
+        self.assertEqual(
+            [recipe['id'] for recipe in results[:2]],
+            [self.recipes[1].pk, self.recipes[0].pk]
+        )
+
+    def test_refreshed_after_commit(self):
+        self.match(self.ingredients[50:52], 0)
+        recipe = self.recipes[5]
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientRecipe.objects.filter(recipe=recipe).delete()
+            IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=self.ingredients[50], amount=1
+            )
+            # Другие процессы не должны увидеть изменение до фиксации.
+            self.assertIsNone(cache.get(MATCH_VERSION_KEY))
+        self.assertEqual(cache.get(MATCH_VERSION_KEY), 1)
+        results = self.match(self.ingredients[50:52], 0)
+        self.assertEqual([item['id'] for item in results], [recipe.pk])
+
+    def test_consistent_snapshot(self):
+        expected = ingredient_matcher.match(
+            [item.pk for item in self.ingredients[:4]], 2
+        )
+        state = ingredient_matcher._get_state()
+
+        def remove_recipe(planes, bits):
+            # Изменение из другого потока между снимком и подсчётом.
+            with ingredient_matcher._lock:
+                ingredient_matcher._set_recipe(
+                    state, self.recipes[0].pk, None
+                )
+            return add_to_planes(planes, bits)
+
+        with patch('recipes.matching.add_to_planes', remove_recipe):
+            results = ingredient_matcher.match(
+                [item.pk for item in self.ingredients[:4]], 2
+            )
+        self.assertEqual(results, expected)
+
+
+class CounterTest(RecipeFixturesMixin, APITestCase):
+    """
+    Денормализованные счётчики совпадают с числом строк после создания,
+    удаления и каскадного удаления.
+    """
+
+    def assertCountersMatch(self):
+        recipes = Recipe.objects.annotate(
+            favorite_rows=Count('favorites_recipe', distinct=True),
+            cart_rows=Count('carts', distinct=True),
+        )
+        for recipe in recipes:
+            self.assertEqual(
+                (recipe.favorites_count, recipe.carts_count),
+                (recipe.favorite_rows, recipe.cart_rows), recipe
+            )
+        users = User.objects.annotate(
+            recipe_rows=Count('recipes', distinct=True),
+            follower_rows=Count('following', distinct=True),
+        )
+        for user in users:
+            self.assertEqual(
+                (user.recipes_count, user.followers_count),
+                (user.recipe_rows, user.follower_rows), user
+            )
+
+    def test_fixtures(self):
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipes[0].pk).favorites_count, 1
+        )
+        self.assertEqual(
+            User.objects.get(pk=self.authors[0].pk).followers_count, 1
+        )
+        self.assertCountersMatch()
+
+    def test_api_create_and_delete(self):
+        self.client.force_authenticate(self.user)
+        recipe = self.recipes[2]
+        for relation in ('favorite', 'shopping_cart'):
+            path = f'/api/recipes/{recipe.pk}/{relation}/'
+            self.assertEqual(self.client.post(path).status_code, 201)
+            self.assertCountersMatch()
+            self.assertEqual(self.client.post(path).status_code, 400)
+            self.assertCountersMatch()
+        self.client.post(f'/api/users/{self.authors[1].pk}/subscribe/')
+        self.assertCountersMatch()
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        self.assertEqual((recipe.favorites_count, recipe.carts_count), (1, 1))
+        for relation in ('favorite', 'shopping_cart'):
+            self.client.delete(f'/api/recipes/{recipe.pk}/{relation}/')
+        self.client.delete(f'/api/users/{self.authors[1].pk}/subscribe/')
+        self.assertCountersMatch()
+
+    def test_cascade_user_delete(self):
+        reader = User.objects.create_user(
+            username='other', email='other@foodgram.ru', password='pass'
+        )
+        Favorite.objects.create(user=reader, recipe=self.recipes[0])
+        ShoppingCart.objects.create(user=reader, recipe=self.recipes[0])
+        Subscribe.objects.create(user=reader, author=self.authors[0])
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipes[0].pk).favorites_count, 2
+        )
+        reader.delete()
+        self.assertCountersMatch()
+
+    def test_cascade_recipe_delete(self):
+        self.recipes[0].delete()
+        self.assertEqual(
+            User.objects.get(pk=self.authors[0].pk).recipes_count, 3
+        )
+        self.assertCountersMatch()
+
+    def test_refresh_counters(self):
+        Recipe.objects.update(favorites_count=7, carts_count=7)
+        User.objects.update(recipes_count=7, followers_count=7)
+        call_command('refresh_counters')
+        self.assertCountersMatch()
+
+
+class FeedTest(RecipeFixturesMixin, APITestCase):
+    """
+    Лента подписок: первая страница кэшируется и сбрасывается при
+    подписке, отписке, новом рецепте автора и изменении избранного.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def feed(self):
+        response = self.client.get('/api/recipes/feed/', {'limit': 20})
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def authors_in_feed(self):
+        return {recipe['author']['id'] for recipe in self.feed()}
+
+    def test_first_page_cached(self):
+        self.assertEqual(self.authors_in_feed(), {self.authors[0].pk})
+        with self.assertNumQueries(0):
+            self.feed()
+
+    def test_follow_and_unfollow(self):
+        self.feed()
+        path = f'/api/users/{self.authors[1].pk}/subscribe/'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(path).status_code, 201)
+        self.assertEqual(
+            self.authors_in_feed(), {self.authors[0].pk, self.authors[1].pk}
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(path).status_code, 204)
+        self.assertEqual(self.authors_in_feed(), {self.authors[0].pk})
+
+    def test_new_recipe_of_followed_author(self):
+        self.feed()
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = self.create_recipe(12)
+        self.assertEqual(recipe.author, self.authors[0])
+        self.assertEqual(self.feed()[0]['id'], recipe.pk)
+
+    def test_favorite_changes_flags(self):
+        recipe = self.feed()[0]
+        self.assertFalse(recipe['is_favorited'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/recipes/{recipe["id"]}/favorite/')
+        self.assertTrue(self.feed()[0]['is_favorited'])
+
+
+class CatalogTest(RecipeFixturesMixin, APITestCase):
+    """Справочники тегов и ингредиентов: 304 по ETag без запросов к базе."""
+
+    def setUp(self):
+        super().setUp()
+        tag_catalog.reset()
+        ingredient_catalog.reset()
+
+    def test_not_modified(self):
+        for path in ('/api/tags/', '/api/ingredients/'):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            with self.assertNumQueries(0):
+                response = self.client.get(
+                    path, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')
+
+    def test_change_updates_etag(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        Tag.objects.create(name='Новый', slug='new', color='#FFFFFF')
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('new', {tag['slug'] for tag in response.json()})
+
+    def test_search_bypasses_catalog(self):
+        response = self.client.get('/api/ingredients/', {'name': 'ингр'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertEqual(len(response.data), INGREDIENTS_SEARCH_LIMIT)
+
+
+class ShoppingListExportTest(RecipeFixturesMixin, APITestCase):
+    """Переходы статуса фоновой выгрузки: в очереди, в работе, готово."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def request_export(self):
+        response = self.client.post(
+            '/api/shopping_list_exports/', {'format': 'txt'}
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], ShoppingListExport.PENDING)
+        return response.data['id']
+
+    def status(self, pk):
+        return self.client.get(
+            f'/api/shopping_list_exports/{pk}/'
+        ).data['status']
+
+    def test_pending_to_done(self):
+        pk = self.request_export()
+        response = self.client.get(
+            f'/api/shopping_list_exports/{pk}/download/'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(claim_exports(10), [pk])
+        self.assertEqual(claim_exports(10), [])
+        self.assertEqual(self.status(pk), ShoppingListExport.PROCESSING)
+        self.assertEqual(
+            process_export(pk), (pk, ShoppingListExport.DONE)
+        )
+        response = self.client.get(
+            f'/api/shopping_list_exports/{pk}/download/'
+        )
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode()
+        for ingredient in self.ingredients[1:4]:
+            self.assertIn(ingredient.name, content)
+
+    def test_render_error(self):
+        pk = self.request_export()
+        claim_exports(10)
+        with patch('recipes.exports.render_shopping_list',
+                   side_effect=ValueError('broken')):
+            self.assertEqual(
+                process_export(pk), (pk, ShoppingListExport.FAILED)
+            )
+        export = ShoppingListExport.objects.get(pk=pk)
+        self.assertEqual(export.error, 'broken')
+        self.assertIsNotNone(export.finished)
+
+    def test_worker_crash(self):
+        pk = self.request_export()
+        claim_exports(10)
+        in_flight = {pk}
+        ExportWorkersCommand.failed(in_flight, pk)(RuntimeError('killed'))
+        self.assertEqual(in_flight, set())
+        self.assertEqual(self.status(pk), ShoppingListExport.FAILED)
+
+    def test_crash_after_done_keeps_status(self):
+        pk = self.request_export()
+        claim_exports(10)
+        process_export(pk)
+        fail_export(pk, 'late')
+        self.assertEqual(self.status(pk), ShoppingListExport.DONE)
+
+
+class ImportIngredientsTest(RecipeFixturesMixin, APITestCase):
+    """Повторный импорт ничего не меняет и не трогает связи с рецептами."""
+
+    rows = [
+        ('соль', 'г'), ('перец', 'г'), ('Ингредиент 1', 'г'), ('соль', 'г'),
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, extension):
+        path = f'{self.directory}/ingredients.{extension}'
+        with open(path, 'w', encoding='utf-8') as file:
+            if extension == 'csv':
+                file.writelines(
+                    f' {name} ,{unit}\n' for name, unit in self.rows
+                )
+            else:
+                json.dump([
+                    {'name': name, 'measurement_unit': unit}
+                    for name, unit in self.rows
+                ], file, ensure_ascii=False)
+        return path
+
+    def import_file(self, path):
+        call_command('import_ingredients', path, '--batch-size', '2')
+        return set(Ingredient.objects.values_list('name', 'measurement_unit'))
+
+    def test_idempotent(self):
+        rows = IngredientRecipe.objects.count()
+        before = Ingredient.objects.count()
+        csv_names = self.import_file(self.write('csv'))
+        self.assertEqual(len(csv_names), before + 2)
+        self.assertIn(('соль', 'г'), csv_names)
+        self.assertEqual(self.import_file(self.write('csv')), csv_names)
+        self.assertEqual(self.import_file(self.write('json')), csv_names)
+        self.assertEqual(IngredientRecipe.objects.count(), rows)
+        self.assertEqual(
+            Ingredient.objects.get(name='Ингредиент 1').pk,
+            self.ingredients[1].pk
+        )
+
+    def test_json_read_in_chunks(self):
+        items = [
+            {'name': name, 'measurement_unit': unit, 'weight': 12.5}
+            for name, unit in self.rows
+        ]
+        text = json.dumps(items, ensure_ascii=False, indent=2)
+        for size in (1, 3, 64):
+            self.assertEqual(
+                list(iter_json_array(io.StringIO(text), size)), items
+            )
+        for broken in ('', '{}', '[{"name": 1},', '[1,]'):
+            with self.assertRaises(CommandError):
+                list(iter_json_array(io.StringIO(broken), 3))
+
+    def test_unsupported_format(self):
+        with self.assertRaises(CommandError):
+            call_command('import_ingredients', 'ingredients.xml')
+
+
+class RecipeSearchTest(RecipeFixturesMixin, APITestCase):
+    """
+    Поиск рецептов: название весит больше ингредиентов, ингредиенты —
+    больше описания. На SQLite работает индекс в памяти процесса.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        pumpkin = Ingredient.objects.create(
+            name='тыква', measurement_unit='г'
+        )
+        cls.by_name, cls.by_ingredient, cls.by_text = (
+            cls.create_recipe(number) for number in range(12, 15)
+        )
+        Recipe.objects.filter(pk=cls.by_name.pk).update(
+            name='Тыква запечённая'
+        )
+        IngredientRecipe.objects.create(
+            recipe=cls.by_ingredient, ingredient=pumpkin, amount=100
+        )
+        Recipe.objects.filter(pk=cls.by_text.pk).update(
+            text='Подавать с тыква и сметаной'
+        )
+
+    def setUp(self):
+        super().setUp()
+        update_search_vectors()
+
+    def search(self, query):
+        response = self.client.get(
+            '/api/recipes/', {'search': query, 'limit': 20}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_ranked_by_field_weight(self):
+        self.assertEqual(self.search('тыква'), [
+            self.by_name.pk, self.by_ingredient.pk, self.by_text.pk
+        ])
+
+    def test_all_words_required(self):
+        self.assertEqual(self.search('тыква запечённая'), [self.by_name.pk])
+        self.assertEqual(self.search('тыква борщ'), [])
+
+    def test_new_recipe_found_after_save(self):
+        recipe = Recipe.objects.get(pk=self.recipes[0].pk)
+        recipe.name = 'Суп из тыква'
+        recipe.save()
+        self.assertIn(recipe.pk, self.search('тыква'))
+
+    @skipIf(connection.vendor != 'sqlite', 'запасной поиск для SQLite')
+    def test_sqlite_uses_memory_index(self):
+        recipe_index.reset()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.search('тыква')[0], self.by_name.pk)
+        # Индекс строится из базы, а выборка идёт по найденным id.
+        self.assertIsNotNone(recipe_index._postings)
+        self.assertTrue([
+            query['sql'] for query in queries
+            if '"recipes_recipe"."id" IN (' in query['sql']
+        ])
+
+    def test_ingredient_prefix_before_infix(self):
+        Ingredient.objects.create(name='семечки тыквы', measurement_unit='г')
+        Ingredient.objects.create(
+            name='тыквенное масло', measurement_unit='мл'
+        )
+        response = self.client.get('/api/ingredients/', {'name': 'тыкв'})
+        names = [ingredient['name'] for ingredient in response.data]
+        self.assertEqual(
+            names, ['тыква', 'тыквенное масло', 'семечки тыквы']
+        )
+
+
+class PerformanceMiddlewareTest(RecipeFixturesMixin, APITestCase):
+    """Замеры выключены по умолчанию и видны только staff-пользователям."""
+
+    def setUp(self):
+        super().setUp()
+        self.report_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.report_dir)
+        self.staff = User.objects.create_user(
+            username='staff', email='staff@foodgram.ru', password='pass',
+            is_staff=True
+        )
+
+    def get_timing(self, user=None):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        return response.get('Server-Timing')
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(self.get_timing(self.staff))
+
+    def test_server_timing_for_staff_only(self):
+        with self.settings(PERF_SAMPLE_RATE=1,
+                           PERF_REPORT_DIR=self.report_dir):
+            self.assertIsNone(self.get_timing())
+            self.assertIsNone(self.get_timing(self.user))
+            self.assertIn('queries', self.get_timing(self.staff))
+
+    def test_stale_reports(self):
+        path = os.path.join(self.report_dir, '1.json')
+        with open(path, 'w') as file:
+            json.dump({
+                'metrics': METRICS,
+                'endpoints': {'RecipeViewSet.list': {
+                    'count': 1, 'samples': [[1] * len(METRICS)]
+                }},
+                'counters': {},
+            }, file)
+        endpoints, _ = load_reports(self.report_dir)
+        self.assertIn('RecipeViewSet.list', endpoints)
+        with self.settings(PERF_REPORT_MAX_AGE=60):
+            stale = time.time() - 120
+            os.utime(path, (stale, stale))
+            endpoints, _ = load_reports(self.report_dir)
+            self.assertFalse(endpoints)
+            remove_stale_reports(self.report_dir)
+        self.assertFalse(os.listdir(self.report_dir))
+
+
+@skipIf(
+    connection.vendor == 'sqlite',
+    'тестовая база SQLite в памяти блокирует таблицы при параллельной записи'
+)
+class ConcurrentToggleTest(TransactionTestCase):
+    """
+    Параллельные POST на избранное, список покупок и подписку: один
+    запрос создаёт строку, остальные получают 400, ни одного 500.
+    Запускается на PostgreSQL, как в CI.
+    """
+
+    THREADS = 8
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', email='reader@foodgram.ru', password='pass'
+        )
+        self.author = User.objects.create_user(
+            username='author', email='author@foodgram.ru', password='pass'
+        )
+        self.recipe = Recipe.objects.create(
+            name='Рецепт', text='Описание',
+            image='recipes/images/recipe.png', cooking_time=10,
+            author=self.author
+        )
+
+    def post_concurrently(self, path):
+        barrier = threading.Barrier(self.THREADS)
+        statuses = []
+
+        def post():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            client.raise_request_exception = False
+            try:
+                barrier.wait()
+                statuses.append(client.post(path).status_code)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=post) for _ in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sorted(statuses)
+
+    def assertSingleRow(self, path, queryset):
+        statuses = self.post_concurrently(path)
+        self.assertEqual(statuses, [201] + [400] * (self.THREADS - 1))
+        self.assertEqual(queryset.count(), 1)
+
+    def test_favorite(self):
+        self.assertSingleRow(
+            f'/api/recipes/{self.recipe.pk}/favorite/',
+            Favorite.objects.filter(user=self.user, recipe=self.recipe)
+        )
+
+    def test_shopping_cart(self):
+        self.assertSingleRow(
+            f'/api/recipes/{self.recipe.pk}/shopping_cart/',
+            ShoppingCart.objects.filter(user=self.user, recipe=self.recipe)
+        )
+
+    def test_subscribe(self):
+        self.assertSingleRow(
+            f'/api/users/{self.author.pk}/subscribe/',
+            Subscribe.objects.filter(user=self.user, author=self.author)
+        )
@@ -1,7 +1,9 @@
 from django.urls import include, path
 from rest_framework.routers import SimpleRouter
 
-from .views import IngredientViewSet, TagViewSet, RecipeViewSet
+from .views import (
+    IngredientViewSet, TagViewSet, RecipeViewSet, ShoppingListExportViewSet
+)
 
 app_name = 'recipes'
 
@@ -9,5 +11,9 @@ router = SimpleRouter()
 router.register('tags', TagViewSet, basename='tags')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
+router.register(
+    'shopping_list_exports', ShoppingListExportViewSet,
+    basename='shopping_list_exports'
+)
 
 urlpatterns = [path('', include(router.urls))]
@@ -1,51 +1,103 @@
-from django.db.models import Sum
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
 from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags
 
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
+from .caching import AnonymousCacheMixin, ConditionalGetMixin
+from .cart import add_to_cart, cart_totals, remove_from_cart
+from .catalog import ingredient_catalog, tag_catalog
+from .exports import cart_ingredients
+from .feed import feed_cache_key
 from .filters import IngredientFilter, RecipeFilter
+from .matching import ingredient_matcher
 from .models import (
     Ingredient, Tag, Recipe,
-    Favorite, ShoppingCart, IngredientRecipe
+    Favorite, ShoppingCart, ShoppingListExport
 )
+from .negotiation import ShoppingListContentNegotiation
+from .paginations import RecipeCursorPagination, RecipePagination
 from .permissions import IsAuthenticatedOwnerOrReadOnly
 from .serializers import (
     IngredientSerializer, TagSerializer, RecipeSerializer,
-    BriefRecipeSerializer, RecipeListSerializer
+    BriefRecipeSerializer, RecipeIdsSerializer, RecipeListSerializer,
+    RecipeMatchSerializer, ShoppingListExportSerializer
 )
-from backend.services.shoplist import download_pdf
+from backend.constants import (
+    CART_BATCH_LIMIT, FEED_CACHE_TIMEOUT, MATCH_MAX_MISSING,
+    MATCH_RESULTS_LIMIT, SHOPPING_LIST_DEFAULT_FORMAT, SHOPPING_LIST_FORMATS
+)
+from backend.services.shoplist import (
+    STREAMS, download_pdf, download_stream, shopping_list_lines
+)
+from users.models import Subscribe
+
+
+class CatalogListMixin:
+    """Отдаёт полный список справочника из кэша с поддержкой ETag."""
+    catalog = None
 
+    def use_catalog(self, request):
+        return True
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+    def list(self, request, *args, **kwargs):
+        if not self.use_catalog(request):
+            return super().list(request, *args, **kwargs)
+        content, etag = self.catalog.get()
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        return response
+
+
+class IngredientViewSet(CatalogListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     pagination_class = None
     serializer_class = IngredientSerializer
+    authentication_classes = ()
     permission_classes = (AllowAny,)
     filter_backends = (IngredientFilter,)
-    search_fields = ('^name',)
+    catalog = ingredient_catalog
 
+    def use_catalog(self, request):
+        return not request.query_params.get(IngredientFilter.search_param)
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagViewSet(CatalogListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     pagination_class = None
+    authentication_classes = ()
     permission_classes = (AllowAny,)
     serializer_class = TagSerializer
+    catalog = tag_catalog
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, AnonymousCacheMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
+    pagination_class = RecipePagination
     permission_classes = (IsAuthenticatedOwnerOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        return Recipe.objects.with_related().with_user_relations(
+            self.request.user
+        )
+
     def get_serializer_class(self):
-        if self.action == 'retrieve':
+        if self.action in ('list', 'retrieve'):
             return RecipeListSerializer
         return super().get_serializer_class()
 
@@ -54,21 +106,29 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @staticmethod
     def __favorite_shopping(request, pk, model, errors):
+        """
+        Добавление — один INSERT: повторный запрос (например, двойной клик)
+        упирается в ограничение уникальности и получает 400, а не 500.
+        Удаление проверяет число удалённых строк вместо exists().
+        """
         if request.method == 'POST':
-            if model.objects.filter(user=request.user, recipe__id=pk).exists():
+            recipe = get_object_or_404(Recipe, id=pk)
+            try:
+                with transaction.atomic():
+                    model.objects.create(user=request.user, recipe=recipe)
+            except IntegrityError:
                 return Response(
                     {'errors': errors['recipe_in']},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            recipe = get_object_or_404(Recipe, id=pk)
-            model.objects.create(user=request.user, recipe=recipe)
             serializer = BriefRecipeSerializer(
                 recipe, context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        recipe = model.objects.filter(user=request.user, recipe__id=pk)
-        if recipe.exists():
-            recipe.delete()
+        deleted, _ = model.objects.filter(
+            user=request.user, recipe_id=pk
+        ).delete()
+        if deleted:
             return Response(
                 {'msg': 'Успешно удалено'},
                 status=status.HTTP_204_NO_CONTENT
@@ -100,29 +160,218 @@ class RecipeViewSet(viewsets.ModelViewSet):
             'recipe_not_in': 'Рецепта нет в спике покупок'
         })
 
+    @staticmethod
+    def cart_response(request, changed, response_status):
+        return Response(
+            {'changed': changed, 'ingredients': cart_totals(request.user.id)},
+            status=response_status
+        )
+
+    @action(
+        methods=['POST', 'DELETE'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart'
+    )
+    def shopping_cart_batch(self, request):
+        """
+        Добавляет в список покупок или удаляет из него сразу несколько
+        рецептов: {"recipes": [id, ...]}. Отвечает итоговым количеством
+        ингредиентов в списке покупок.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = [
+            recipe.pk for recipe in serializer.validated_data['recipes']
+        ]
+        if request.method == 'DELETE':
+            removed = remove_from_cart(request.user.id, recipe_ids)
+            return self.cart_response(request, removed, status.HTTP_200_OK)
+        added = add_to_cart(
+            request.user.id, Recipe.objects.filter(pk__in=recipe_ids)
+        )
+        return self.cart_response(request, added, status.HTTP_201_CREATED)
+
+    @action(
+        methods=['POST'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart/filtered'
+    )
+    def shopping_cart_filtered(self, request):
+        """
+        Добавляет в список покупок все рецепты, подходящие под фильтры
+        списка рецептов (?author=, ?tags=, ?search= и т. д.). Без фильтров
+        запрос отклоняется, чтобы не добавить весь каталог; подходящих
+        рецептов должно быть не больше CART_BATCH_LIMIT.
+        """
+        if not any(
+            value for name in RecipeFilter.base_filters
+            for value in request.query_params.getlist(name)
+        ):
+            return Response(
+                {'errors': 'Укажите хотя бы один фильтр рецептов'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        recipes = self.filter_queryset(Recipe.objects.all())
+        if recipes.order_by()[:CART_BATCH_LIMIT + 1].count() > (
+                CART_BATCH_LIMIT):
+            return Response(
+                {'errors': f'Под фильтры подходит больше '
+                           f'{CART_BATCH_LIMIT} рецептов, уточните их'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        added = add_to_cart(request.user.id, recipes)
+        return self.cart_response(request, added, status.HTTP_201_CREATED)
+
+    @action(
+        methods=['DELETE'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart/all'
+    )
+    def shopping_cart_clear(self, request):
+        removed = remove_from_cart(request.user.id)
+        return self.cart_response(request, removed, status.HTTP_200_OK)
+
     @action(
         methods=['GET'],
         detail=False,
         permission_classes=[IsAuthenticated]
     )
-    @action(methods=['GET'], detail=False, permission_classes=[AllowAny])
+    def feed(self, request):
+        """
+        Рецепты авторов, на которых подписан пользователь, от новых к
+        старым. Всегда курсорная пагинация; первая страница кэшируется
+        до публикации нового рецепта подписок.
+        """
+        paginator = RecipeCursorPagination()
+        first_page = paginator.cursor_query_param not in request.query_params
+        if first_page:
+            key = feed_cache_key(
+                request.user.id,
+                request.query_params.get(paginator.page_size_query_param)
+            )
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+        queryset = self.get_queryset().filter(
+            author__in=Subscribe.objects.filter(
+                user=request.user
+            ).values('author')
+        )
+        page = paginator.paginate_queryset(queryset, request, self)
+        serializer = RecipeListSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        response = paginator.get_paginated_response(serializer.data)
+        if first_page:
+            cache.set(key, response.data, FEED_CACHE_TIMEOUT)
+        return response
+
+    @action(methods=['GET'], detail=False)
+    def match(self, request):
+        """
+        Рецепты из имеющихся ингредиентов: ?ingredients=1,2,3 и
+        ?max_missing= — сколько ингредиентов может не хватать.
+        """
+        try:
+            ingredient_ids = {
+                int(pk)
+                for value in request.query_params.getlist('ingredients')
+                for pk in value.split(',') if pk.strip()
+            }
+            max_missing = int(request.query_params.get('max_missing', 0))
+            limit = int(
+                request.query_params.get('limit', MATCH_RESULTS_LIMIT)
+            )
+        except ValueError:
+            return Response(
+                {'errors': 'ingredients, max_missing и limit '
+                           'должны быть целыми числами'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not ingredient_ids:
+            return Response(
+                {'errors': 'Укажите хотя бы один ингредиент'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        matches = ingredient_matcher.match(
+            ingredient_ids,
+            max_missing=min(max(max_missing, 0), MATCH_MAX_MISSING),
+            limit=min(max(limit, 1), MATCH_RESULTS_LIMIT),
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in matches]
+        )
+        results = []
+        for recipe_id, matched, total in matches:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.matched_ingredients = matched
+                recipe.total_ingredients = total
+                results.append(recipe)
+        serializer = RecipeMatchSerializer(
+            results, many=True, context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        content_negotiation_class=ShoppingListContentNegotiation
+    )
     def download_shopping_cart(self, request):
-        ingredients_obj = (
-            IngredientRecipe.objects.filter(recipe__carts__user=request.user)
-            .values('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(sum_amount=Sum('amount'))
+        file_format = request.query_params.get(
+            'format', SHOPPING_LIST_DEFAULT_FORMAT
         )
-        data_dict = {}
-        ingredients_list = []
-        for item in ingredients_obj:
-            name = item['ingredient__name'].capitalize()
-            unit = item['ingredient__measurement_unit']
-            sum_amount = item['sum_amount']
-            data_dict[name] = [sum_amount, unit]
-        for ind, (key, value) in enumerate(data_dict.items(), 1):
-            if ind < 10:
-                ind = '0' + str(ind)
-            ingredients_list.append(
-                f'{ind}. {key} - ' f'{value[0]} ' f'{value[1]}'
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'errors': 'Доступные форматы: '
+                           f'{", ".join(SHOPPING_LIST_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        return download_pdf(ingredients_list)
+        ingredients = cart_ingredients(request.user.id)
+        if file_format in STREAMS:
+            return download_stream(ingredients.iterator(), file_format)
+        return download_pdf(
+            list(shopping_list_lines(ingredients)), request.user.id
+        )
+
+
+class ShoppingListExportViewSet(mixins.CreateModelMixin,
+                                mixins.RetrieveModelMixin,
+                                mixins.ListModelMixin,
+                                viewsets.GenericViewSet):
+    """
+    Фоновая выгрузка списка покупок: POST ставит задачу в очередь
+    run_export_workers, клиент опрашивает её статус и скачивает готовый файл.
+    """
+    serializer_class = ShoppingListExportSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return ShoppingListExport.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+    @action(methods=['GET'], detail=True)
+    def download(self, request, pk):
+        export = self.get_object()
+        if export.status != ShoppingListExport.DONE:
+            return Response(
+                {'errors': 'Файл списка покупок ещё не готов'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return FileResponse(
+            export.file.open('rb'),
+            as_attachment=True,
+            filename=f'shopping_list.{export.file_format}'
+        )
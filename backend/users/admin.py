@@ -9,7 +9,7 @@ from users.models import User, Subscribe
 class UserAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'email', 'username', 'first_name', 'last_name', 'is_superuser',
-        'is_active', 'date_joined'
+        'is_active', 'date_joined', 'recipes_count', 'followers_count'
     )
     list_filter = ('email', 'username')
     list_display_links = ('username',)
@@ -0,0 +1,122 @@
+import copy
+import hashlib
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+
+from backend.constants import AUTH_TOKEN_CACHE_KEY
+from backend.services.metrics import endpoint_stats
+
+
+def shared_cache_key(key):
+    """Сам токен в общий кэш не попадает, только его хэш."""
+    return AUTH_TOKEN_CACHE_KEY.format(
+        digest=hashlib.sha256(key.encode()).hexdigest()
+    )
+
+
+class TokenCache:
+    """
+    Ограниченный LRU-кэш токен -> (user, token) с временем жизни записей.
+    Общий кэш Django, если включён, стоит вторым уровнем за локальным.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self.hits = self.shared_hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                # Копия, чтобы запросы в соседних потоках не делили
+                # изменения одного экземпляра пользователя.
+                user, token = entry[0]
+                return copy.copy(user), token
+        credentials = None
+        if settings.AUTH_TOKEN_CACHE_SHARED:
+            credentials = cache.get(shared_cache_key(key))
+        if credentials is None:
+            self.misses += 1
+            return None
+        self.shared_hits += 1
+        self._store(key, credentials)
+        return credentials
+
+    def set(self, key, credentials):
+        self._store(key, credentials)
+        if settings.AUTH_TOKEN_CACHE_SHARED:
+            cache.set(
+                shared_cache_key(key), credentials,
+                settings.AUTH_TOKEN_CACHE_TIMEOUT
+            )
+
+    def _store(self, key, credentials):
+        expires = time.monotonic() + settings.AUTH_TOKEN_CACHE_TIMEOUT
+        with self._lock:
+            self._entries[key] = (credentials, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys, user_id=None):
+        """
+        Удаляет токены и все записи пользователя user_id. Повторный сброс
+        после фиксации транзакции убирает записи, которые параллельный
+        запрос успел прочитать из базы до неё.
+        """
+        self._forget(keys, user_id)
+        transaction.on_commit(lambda: self._forget(keys, user_id))
+
+    def _forget(self, keys, user_id):
+        with self._lock:
+            if user_id is not None:
+                keys += tuple(
+                    key for key, ((user, _), _) in self._entries.items()
+                    if user.pk == user_id
+                )
+            for key in keys:
+                self._entries.pop(key, None)
+        if keys and settings.AUTH_TOKEN_CACHE_SHARED:
+            cache.delete_many([shared_cache_key(key) for key in keys])
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+        }
+
+
+token_cache = TokenCache()
+endpoint_stats.register_counters('auth_token_cache', token_cache.stats)
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без запроса к authtoken_token и users_user на
+    каждый запрос: пара (user, token) берётся из token_cache. Записи
+    сбрасываются сигналами users.signals при выходе, удалении токена,
+    деактивации и смене пароля.
+
+    QuerySet.update() и delete() без загрузки строк (_raw_delete, сырой
+    SQL) сигналов не отправляют: после User.objects.filter(...).update(
+    is_active=False) токен действует до AUTH_TOKEN_CACHE_TIMEOUT. Такой
+    код должен сам вызвать token_cache.invalidate(user_id=...).
+    """
+
+    def authenticate_credentials(self, key):
+        credentials = token_cache.get(key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            token_cache.set(key, credentials)
+        return credentials
@@ -5,6 +5,7 @@ from django.db import models
 
 from backend.constants import (
     EMAIL_VERBOSE_NAME, USERNAME_VERBOSE_NAME,
+    RECIPES_COUNT_VERBOSE_NAME, FOLLOWERS_COUNT_VERBOSE_NAME,
     EMAIL_ALREADY_REGISTERED,
     USERNAME_ALREADY_REGISTERED,
     USERNAME_HELP_TEXT, USERNAME_MAX_LENGTH, EMAIL_MAX_LENGTH,
@@ -32,6 +33,12 @@ class User(AbstractUser):
             'unique': USERNAME_ALREADY_REGISTERED,
         },
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name=RECIPES_COUNT_VERBOSE_NAME, default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name=FOLLOWERS_COUNT_VERBOSE_NAME, default=0, editable=False
+    )
 
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
     USERNAME_FIELD = 'email'
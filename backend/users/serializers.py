@@ -42,9 +42,7 @@ class UserModificationSerializer(serializers.ModelSerializer):
 
 class SubscribeListSerializer(UserRepresentationSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source='recipes.count', read_only=True
-    )
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(UserRepresentationSerializer.Meta):
         fields = UserRepresentationSerializer.Meta.fields + (
@@ -53,15 +51,13 @@ class SubscribeListSerializer(UserRepresentationSerializer):
 
     def get_recipes(self, obj):
         request = self.context.get('request')
-        limit = request.query_params.get('recipes_limit') if request else None
-        queryset = obj.recipes.all()
-        if limit:
-            try:
-                limit = int(limit)
+        if hasattr(obj, 'recent_recipes'):
+            queryset = obj.recent_recipes
+        else:
+            queryset = obj.recipes.all()
+            limit = self.context.get('recipes_limit')
+            if limit is not None:
                 queryset = queryset[:limit]
-            except (ValueError, TypeError):
-                raise serializers.ValidationError(
-                    'recipes_limit must be an integer')
         return BriefRecipeSerializer(
             queryset,
             many=True,
@@ -71,8 +67,7 @@ class SubscribeListSerializer(UserRepresentationSerializer):
 
 class UserWithRecipesSerializer(serializers.ModelSerializer):
     recipes = BriefRecipeSerializer(many=True)
-    recipes_count = serializers.IntegerField(
-        source='recipes.count', read_only=True)
+    recipes_count = serializers.IntegerField(read_only=True)
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -0,0 +1,39 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.counters import change_counter
+from recipes.feed import invalidate_feeds
+from .authentication import token_cache
+from .models import Subscribe, User
+
+
+@receiver((post_save, post_delete), sender=Subscribe)
+def count_followers(sender, instance, signal, created=True, **kwargs):
+    if created:
+        change_counter(
+            User, instance.author_id, 'followers_count',
+            1 if signal is post_save else -1
+        )
+
+
+@receiver((post_save, post_delete), sender=Subscribe)
+def invalidate_subscriber_feed(sender, instance, **kwargs):
+    invalidate_feeds(instance.user_id)
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, created, update_fields=None,
+                       **kwargs):
+    # Вход обновляет только last_login — токены остаются в силе.
+    if created or update_fields and set(update_fields) == {'last_login'}:
+        return
+    token_cache.invalidate(
+        *Token.objects.filter(user=instance).values_list('key', flat=True),
+        user_id=instance.pk
+    )
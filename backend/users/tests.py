@@ -0,0 +1,69 @@
+import time
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from .authentication import token_cache
+from .models import User
+
+
+@override_settings(AUTH_TOKEN_CACHE_TIMEOUT=60)
+class CachingTokenAuthenticationTest(APITestCase):
+    """Токен из кэша перестаёт действовать вместе с токеном в базе."""
+
+    def setUp(self):
+        cache.clear()
+        token_cache._entries.clear()
+        self.user = User.objects.create_user(
+            username='reader', email='reader@foodgram.ru', password='pass'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get_me(self):
+        return self.client.get('/api/users/me/')
+
+    def test_cached_without_token_query(self):
+        self.assertEqual(self.get_me().status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_me().status_code, 200)
+        self.assertFalse([
+            query['sql'] for query in queries
+            if 'authtoken_token' in query['sql']
+        ])
+
+    def test_logout(self):
+        self.assertEqual(self.get_me().status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_me().status_code, 401)
+
+    def test_deactivate_with_save(self):
+        self.assertEqual(self.get_me().status_code, 200)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.get_me().status_code, 401)
+
+    def test_login_keeps_cache(self):
+        self.assertEqual(self.get_me().status_code, 200)
+        self.user.save(update_fields=['last_login'])
+        self.assertIsNotNone(token_cache.get(self.token.key))
+
+    def test_update_bypasses_invalidation_until_expiry(self):
+        # QuerySet.update() не отправляет post_save: запись в кэше живёт
+        # до истечения AUTH_TOKEN_CACHE_TIMEOUT.
+        self.assertEqual(self.get_me().status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.get_me().status_code, 200)
+        expired = time.monotonic() + 61
+        with patch('users.authentication.time.monotonic',
+                   return_value=expired):
+            self.assertIsNone(token_cache.get(self.token.key))
+            self.assertEqual(self.get_me().status_code, 401)
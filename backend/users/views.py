@@ -1,12 +1,17 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, Value
 from django.shortcuts import get_object_or_404
 from rest_framework import (
     permissions, status,
     generics, viewsets
 )
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from recipes.models import Recipe
+from recipes.paginations import SubscriptionPagination
 from .models import User, Subscribe
 from .serializers import (
     SubscribeListSerializer,
@@ -35,9 +40,39 @@ class SubscriptionsView(generics.ListAPIView):
     queryset = User.objects.all()
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = SubscribeListSerializer
+    pagination_class = SubscriptionPagination
+
+    def get_recipes_limit(self):
+        limit = self.request.query_params.get('recipes_limit')
+        if not limit:
+            return None
+        try:
+            limit = int(limit)
+        except (ValueError, TypeError):
+            raise ValidationError(
+                {'recipes_limit': 'recipes_limit must be an integer'})
+        if limit < 0:
+            raise ValidationError(
+                {'recipes_limit': 'recipes_limit must not be negative'})
+        return limit
 
     def get_queryset(self):
-        return User.objects.filter(following__user=self.request.user)
+        return User.objects.filter(
+            following__user=self.request.user
+        ).annotate(
+            is_subscribed=Value(True)
+        ).prefetch_related(Prefetch(
+            'recipes',
+            queryset=Recipe.objects.latest_per_author(
+                self.get_recipes_limit()
+            ),
+            to_attr='recent_recipes',
+        ))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['recipes_limit'] = self.get_recipes_limit()
+        return context
 
 
 class SubscriptionsViewSet(viewsets.ModelViewSet):
@@ -57,15 +92,14 @@ class SubscriptionsViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        if Subscribe.objects.filter(user=user, author=author).exists():
+        try:
+            with transaction.atomic():
+                Subscribe.objects.create(user=user, author=author)
+        except IntegrityError:
             return Response(
                 {'errors': 'You are already subscribed to this author.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-
-        Subscribe.objects.create(
-            user=user, author=author
-        )
         subscribe_serializer = UserWithRecipesSerializer(
             author, context={'request': request})
         return Response(
@@ -75,12 +109,11 @@ class SubscriptionsViewSet(viewsets.ModelViewSet):
 
     @subscribe.mapping.delete
     def unsubscribe(self, request, **kwargs):
-        id = kwargs.get('pk')
-        user = self.request.user
-        author = get_object_or_404(User, id=id)
-        follow = Subscribe.objects.filter(user=user, author=author)
-        if follow.exists():
-            follow.delete()
+        author = get_object_or_404(User, id=kwargs.get('pk'))
+        deleted, _ = Subscribe.objects.filter(
+            user=self.request.user, author=author
+        ).delete()
+        if deleted:
             return Response(
                 {'detail': 'Вы отписались от автора'},
                 status=status.HTTP_204_NO_CONTENT